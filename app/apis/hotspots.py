@@ -1,9 +1,12 @@
 from fastapi import APIRouter, HTTPException, Query
 from datetime import datetime, timedelta
 import os
-from ..database import fishing_locations
+from ..database import async_fishing_locations, fishing_locations, run_db
 from ..models import FishingLocationRequest
-from ..utils import parse_location_data, haversine, get_next_hotspot_id
+from ..utils import parse_location_data
+from ..hotspot_service import create_hotspots
+from ..spatial import geohash_center, HOTSPOT_GEOHASH_PRECISION
+from ..streaming import stream_documents, parse_keyset_cursor
 
 router = APIRouter()
 
@@ -13,29 +16,23 @@ async def save_fishing_location(request: FishingLocationRequest):
 
     # Retrieve radius from the environment file
     radius_in_meters = float(os.getenv("LOCATION_RADIUS_METERS", 20))  # Default to 20 meters if not set
-    if any(
-        haversine(latitude, longitude, loc["latitude"], loc["longitude"]) <= radius_in_meters
-        for loc in fishing_locations.find({"status": "active"})
-    ):
-        return {"status": "failed", "message": "Location exists within the radius.", "radius": radius_in_meters}
 
-    # Save location
-    hotspot_id = get_next_hotspot_id()
-    data = {
-        "hotspotId": hotspot_id,
+    # Dedup against active hotspots and save through the shared hotspot service
+    [result] = await run_db(create_hotspots, [{
         "vesselId": vessel_id,
         "messageId": message_id,
         "latitude": latitude,
         "longitude": longitude,
-        "currentDateTime": datetime.now().isoformat(),
-        "status": "active",
         "f": request.f,
-    }
-    result = fishing_locations.insert_one(data)
+    }], radius_in_meters)
+    if result["status"] == "failed":
+        return {"status": "failed", "message": result["message"], "radius": radius_in_meters}
 
     # Add the inserted ID as a string to the response
-    data["_id"] = str(result.inserted_id)
+    data = {**result["data"], "_id": str(result["data"]["_id"])}
 
+    if result.get("merged"):
+        return {"status": "success", "message": f"Fishing location merged into hotspot {data['hotspotId']}", "data": data}
     return {"status": "success", "message": "Fishing location saved successfully", "data": data}
 
 # GET endpoint to retrieve fishing locations by period
@@ -43,7 +40,12 @@ async def save_fishing_location(request: FishingLocationRequest):
 async def get_fishing_locations(
     period: str = Query(None, description="Filter by 'month', 'year', 'last year', or a date range"),
     start_date: str = Query(None, description="Start date in YYYY-MM-DD format (optional if period is given)"),
-    end_date: str = Query(None, description="End date in YYYY-MM-DD format (optional if period is given)")
+    end_date: str = Query(None, description="End date in YYYY-MM-DD format (optional if period is given)"),
+    limit: int = Query(0, ge=0, description="Page size (0 = everything)"),
+    after: str = Query(None, description="Keyset cursor: 'next' of the previous page"),
+    format: str = Query("json", regex="^(json|ndjson)$", description="json (default) or ndjson"),
+    aggregate: str = Query(None, regex="^(grid|day)$", description="Return counts per geohash cell (grid) or per day instead of points"),
+    precision: int = Query(5, ge=1, le=HOTSPOT_GEOHASH_PRECISION, description="Geohash length of the grid cells"),
 ):
     try:
         # Determine the date range based on period
@@ -67,18 +69,60 @@ async def get_fishing_locations(
             )
 
         # Convert start_date and end_date to datetime objects
-        start_datetime = datetime.strptime(start_date, "%Y-%m-%d")
-        end_datetime = datetime.strptime(end_date, "%Y-%m-%d")
+        try:
+            start_datetime = datetime.strptime(start_date, "%Y-%m-%d")
+            end_datetime = datetime.strptime(end_date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format.")
 
-        # Query the database for locations in the specified date range
+        # currentDateTime is a BSON date, served by the (currentDateTime, _id) index;
+        # the end date is included as a whole day
         query = {
             "currentDateTime": {
-                "$gte": start_datetime.isoformat(),
-                "$lte": end_datetime.isoformat()
+                "$gte": start_datetime,
+                "$lt": end_datetime + timedelta(days=1)
             }
         }
-        results = list(fishing_locations.find(query, {"_id": 0}))
 
-        return {"status": "success", "data": results}
+        if aggregate == "grid":
+            cells = await async_fishing_locations.aggregate([
+                {"$match": {**query, "geohash": {"$type": "string"}}},
+                {"$group": {
+                    "_id": {"$substrCP": ["$geohash", 0, precision]},
+                    "count": {"$sum": 1},
+                    "first": {"$min": "$currentDateTime"},
+                    "last": {"$max": "$currentDateTime"},
+                }},
+                {"$sort": {"_id": 1}},
+            ])
+            data = []
+            for cell in cells:
+                latitude, longitude = geohash_center(cell["_id"])
+                data.append({"cell": cell.pop("_id"), "latitude": latitude, "longitude": longitude, **cell})
+            return {"status": "success", "data": data}
+
+        if aggregate == "day":
+            days = await async_fishing_locations.aggregate([
+                {"$match": query},
+                {"$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$currentDateTime"}},
+                    "count": {"$sum": 1},
+                }},
+                {"$sort": {"_id": 1}},
+            ])
+            return {"status": "success", "data": [{"day": day["_id"], "count": day["count"]} for day in days]}
+
+        if after:
+            query = {"$and": [query, parse_keyset_cursor(after, "currentDateTime", datetime.fromisoformat)]}
+
+        cursor = fishing_locations.find(query).sort([("currentDateTime", 1), ("_id", 1)])
+        if limit:
+            cursor = cursor.limit(limit)
+        cursor = cursor.batch_size(1000)
+
+        return stream_documents(cursor, format, sort_field="currentDateTime", limit=limit)
+
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
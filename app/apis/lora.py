@@ -0,0 +1,107 @@
+from fastapi import APIRouter, HTTPException, Request
+from datetime import datetime
+import os
+from ..database import run_db
+from ..lora import parse_text_frame, parse_binary_frame
+from ..ingest import insert_vessel_locations
+from ..hotspot_service import create_hotspots
+
+router = APIRouter()
+
+LORA_MAX_FRAME_BYTES = int(os.getenv("LORA_MAX_FRAME_BYTES", 1048576))
+
+
+def _store_frame(frame, radius_in_meters):
+    """Write a parsed frame: f=1 messages become hotspots, the rest vessel locations."""
+    errors = {}
+    now = datetime.now()
+    hotspot_rows = frame[frame["f"] == 1]
+    location_rows = frame[frame["f"] != 1]
+
+    documents = [
+        {"vesselId": vessel_id, "dateTime": now.isoformat(), "ts": now, "lat": latitude, "lng": longitude}
+        for vessel_id, latitude, longitude in zip(
+            location_rows["vesselId"], location_rows["lat"].tolist(), location_rows["lng"].tolist()
+        )
+    ]
+    for position, message in insert_vessel_locations(documents).items():
+        errors[int(location_rows["index"][position])] = message
+
+    candidates = [
+        {"vesselId": vessel_id, "messageId": message_id, "latitude": latitude, "longitude": longitude, "f": 1}
+        for vessel_id, message_id, latitude, longitude in zip(
+            hotspot_rows["vesselId"], hotspot_rows["messageId"],
+            hotspot_rows["lat"].tolist(), hotspot_rows["lng"].tolist(),
+        )
+    ]
+    created = merged = 0
+    for index, result in zip(hotspot_rows["index"].tolist(), create_hotspots(candidates, radius_in_meters)):
+        if result["status"] == "failed":
+            errors[index] = result["message"]
+        elif result.get("merged"):
+            merged += 1
+        else:
+            created += 1
+    return created, merged, errors
+
+
+async def _read_frame(request):
+    """Request body, refused with 413 as soon as it is known to exceed LORA_MAX_FRAME_BYTES."""
+    too_large = HTTPException(status_code=413, detail=f"Frame larger than {LORA_MAX_FRAME_BYTES} bytes")
+    try:
+        declared = int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    if declared > LORA_MAX_FRAME_BYTES:
+        raise too_large
+
+    # Chunked or mis-declared bodies: stop reading once past the limit
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > LORA_MAX_FRAME_BYTES:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+@router.post("/lora/messages")
+async def save_lora_messages(request: Request):
+    """
+    Save raw LoRa messages as the gateway receives them, without a JSON
+    envelope: newline-delimited `id,l,f` text (text/plain) or a packed
+    binary frame (application/octet-stream, see app/lora.py). Messages with
+    f=1 are saved as fishing hotspots, the others as vessel locations.
+    """
+    try:
+        payload = await _read_frame(request)
+
+        if request.headers.get("content-type", "").startswith("application/octet-stream"):
+            try:
+                frame, errors, total = parse_binary_frame(payload)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        else:
+            frame, errors, total = parse_text_frame(payload)
+
+        radius_in_meters = float(os.getenv("LOCATION_RADIUS_METERS", 20))
+        created, merged, write_errors = await run_db(_store_frame, frame, radius_in_meters)
+        errors.update(write_errors)
+
+        saved = total - len(errors)
+        return {
+            "status": "success" if saved else "failed",
+            "message": f"{saved} of {total} message(s) saved.",
+            "saved": saved,
+            "hotspotsCreated": created,
+            "hotspotsMerged": merged,
+            "failed": len(errors),
+            "errors": [{"index": index, "error": errors[index]} for index in sorted(errors)],
+        }
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred: {str(e)}"
+        )
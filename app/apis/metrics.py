@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+import os
+from .. import metrics
+from ..cache import suggestion_cache
+from ..ingest import vessel_write_buffer
+from ..spatial import active_hotspot_index
+from ..dwell import dwell_detector
+from ..profiler import profiler
+
+router = APIRouter()
+
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+
+write_behind_depth = metrics.Gauge("vessel_write_behind_queue_depth", "Vessel locations waiting in the write-behind queue.")
+write_behind_total = metrics.Gauge("vessel_write_behind_documents", "Write-behind buffer counters.", ("counter",))
+suggestion_cache_entries = metrics.Gauge("suggestion_cache_entries", "Entries in the suggestion cache.")
+suggestion_cache_total = metrics.Gauge("suggestion_cache_events", "Suggestion cache counters.", ("event",))
+hotspot_index_size = metrics.Gauge("active_hotspot_index_size", "Active hotspots in this worker's in-memory index.")
+dwell_vessels = metrics.Gauge("dwell_tracked_vessels", "Vessels with a track in this worker's dwell detector.")
+dwell_total = metrics.Gauge("dwell_detector_points", "Dwell detector counters.", ("counter",))
+
+
+def _collect_runtime_stats():
+    write_behind_depth.set(value=vessel_write_buffer.depth)
+    for counter in ("enqueued", "rejected", "flushed", "failed", "flushes"):
+        write_behind_total.set(counter, value=vessel_write_buffer.stats[counter])
+    cache = suggestion_cache.snapshot()
+    suggestion_cache_entries.set(value=cache["entries"])
+    for event in ("hits", "misses", "evictions", "expired", "invalidations"):
+        suggestion_cache_total.set(event, value=cache[event])
+    hotspot_index_size.set(value=len(active_hotspot_index.grid))
+    dwell = dwell_detector.snapshot()
+    dwell_vessels.set(value=dwell["vessels"])
+    for counter in ("points", "ignored", "events", "evicted"):
+        dwell_total.set(counter, value=dwell[counter])
+
+
+metrics.COLLECTORS.append(_collect_runtime_stats)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Request, MongoDB, scheduler job, write-behind and cache metrics of this
+    worker in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def _check_profiler_token(token):
+    if not PROFILER_TOKEN:
+        raise HTTPException(status_code=403, detail="Profiler is disabled (PROFILER_TOKEN is not set)")
+    if token != PROFILER_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid profiler token")
+
+
+@router.post("/debug/profiler")
+async def start_profiler(
+    route: str = Query(..., description="Route template to sample, e.g. /suggest_fishing_hotspots"),
+    seconds: float = Query(30, gt=0, le=600, description="How long to sample"),
+    interval_ms: float = Query(5, ge=1, le=1000, description="Sampling interval"),
+    x_profiler_token: str = Header(None),
+):
+    """
+    Start the sampling profiler for one route of this worker.
+    """
+    _check_profiler_token(x_profiler_token)
+    profiler.start(route, seconds, interval_ms)
+    return {"status": "success", "message": f"Profiling {route} for {seconds} s.", "data": profiler.snapshot(top=0)}
+
+
+@router.delete("/debug/profiler")
+async def stop_profiler(x_profiler_token: str = Header(None)):
+    """
+    Stop the sampling profiler; its samples stay available.
+    """
+    _check_profiler_token(x_profiler_token)
+    profiler.stop()
+    return {"status": "success", "message": "Profiler stopped.", "data": profiler.snapshot(top=0)}
+
+
+@router.get("/debug/profiler")
+async def get_profile(
+    format: str = Query("json", regex="^(json|collapsed)$", description="json (top stacks) or collapsed (flame graph input)"),
+    top: int = Query(50, ge=1, le=1000),
+    x_profiler_token: str = Header(None),
+):
+    """
+    Samples collected by the profiler so far.
+    """
+    _check_profiler_token(x_profiler_token)
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    return {"status": "success", "data": profiler.snapshot(top=top)}
@@ -1,83 +1,111 @@
 import os
 import math
 from fastapi import APIRouter, HTTPException, Query
-from ..database import fishing_locations, hotspots_vessels
+from ..database import async_fishing_locations, run_db
+from ..spatial import geohash_encode, nearby_stages
+from ..cache import suggestion_cache
+from ..tiles import SUGGESTION_TILES, TILE_SIZE, suggest_from_tile
 
 router = APIRouter()
 
+EARTH_RADIUS_KM = 6371
+
 def calculate_distance_km(lat1, lon1, lat2, lon2):
     """
-    Calculate distance between two lat/lon pairs in kilometers 
+    Calculate distance between two lat/lon pairs in kilometers
     using the Haversine formula.
     """
     # Convert lat/long to radians
     lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    
+
     # Haversine formula
     dlon = lon2 - lon1
     dlat = lat2 - lat1
     a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
     c = 2 * math.asin(math.sqrt(a))
     # Radius of Earth in kilometers
-    r = 6371  
+    r = EARTH_RADIUS_KM
     return c * r
 
+def build_suggestion_pipeline(latitude, longitude, max_distance_km, max_vessels_per_hotspot, limit):
+    """
+    Whole suggestion in one round trip: nearby active hotspots → free slots
+    only (by their vesselCount) → latest first → top `limit`.
+    """
+    return nearby_stages(latitude, longitude, max_distance_km) + [
+        # Occupancy counter maintained on link/unlink (see app/occupancy.py)
+        {"$addFields": {"vesselCount": {"$ifNull": ["$vesselCount", 0]}}},
+        {"$match": {"vesselCount": {"$lt": max_vessels_per_hotspot}}},
+        {"$sort": {"currentDateTime": -1}},
+        {"$limit": limit},
+        {"$project": {
+            "_id": 0,
+            "hotspotId": 1,
+            "latitude": 1,
+            "longitude": 1,
+            "currentDateTime": 1,
+            "vesselCount": 1,
+            "availableSlots": {"$subtract": [max_vessels_per_hotspot, "$vesselCount"]},
+            "reportCount": 1,
+            "density": 1,
+            "distanceKm": 1,
+        }},
+    ]
+
+def with_distances(hotspots, latitude, longitude):
+    """Copies of the hotspots with `distanceKm` from the given position."""
+    return [
+        {**hotspot, "distanceKm": calculate_distance_km(
+            latitude, longitude, float(hotspot["latitude"]), float(hotspot["longitude"])
+        )}
+        for hotspot in hotspots
+    ]
+
 @router.get("/suggest_fishing_hotspots")
 async def suggest_fishing_hotspots(
     latitude: float = Query(..., description="User's current latitude"),
-    longitude: float = Query(..., description="User's current longitude")
+    longitude: float = Query(..., description="User's current longitude"),
+    limit: int = Query(3, ge=1, le=50, description="Maximum number of hotspots to return"),
+    max_distance_km: float = Query(None, gt=0, description="Search radius in km (defaults to MAX_DISTANCE_THRESHOLD)")
 ):
     """Suggest the latest available fishing hotspots within the maximum distance threshold."""
     try:
         # Fetch threshold from .env (default to 50 km if not set)
-        max_distance_threshold = float(os.getenv("MAX_DISTANCE_THRESHOLD", 50.0))
-        
-        # Fetch all active fishing hotspots
-        active_hotspots = list(fishing_locations.find({"status": "active"}))
-        
-        # If no active hotspots exist, return an empty list
-        if not active_hotspots:
-            return {"status": "success", "message": "No active fishing hotspots available.", "data": []}
-        
+        if max_distance_km is None:
+            max_distance_km = float(os.getenv("MAX_DISTANCE_THRESHOLD", 50.0))
+
         # Retrieve max vessels per hotspot from .env
         max_vessels_per_hotspot = int(os.getenv("MAX_VESSELS_PER_HOTSPOT", 5))
-        
-        available_hotspots = []
-        for hotspot in active_hotspots:
-            hotspot_id = hotspot.get("hotspotId")
-            hotspot_lat = hotspot.get("latitude")
-            hotspot_lon = hotspot.get("longitude")
-            
-            # Calculate distance from user’s lat/long to this hotspot
-            distance_km = calculate_distance_km(
-                latitude, 
-                longitude, 
-                float(hotspot_lat), 
-                float(hotspot_lon)
-            )
-            
-            # Only include hotspots within the max distance threshold
-            if distance_km <= max_distance_threshold:
-                # Count vessels linked to this hotspot
-                vessel_count = hotspots_vessels.count_documents({"hotspotId": hotspot_id})
-                
-                # Only include hotspots that are not fully booked
-                if vessel_count < max_vessels_per_hotspot:
-                    available_hotspots.append({
-                        "hotspotId": hotspot_id,
-                        "latitude": hotspot_lat,
-                        "longitude": hotspot_lon,
-                        "currentDateTime": hotspot.get("currentDateTime"),
-                        "vesselCount": vessel_count,
-                        "availableSlots": max_vessels_per_hotspot - vessel_count,
-                        "distanceKm": distance_km  # (Optional) Useful for debugging/UI
-                    })
 
-        # Sort by currentDateTime (latest first)
-        available_hotspots.sort(key=lambda x: x["currentDateTime"], reverse=True)
+        # Callers in the same geohash cell with the same settings share one result
+        cell = geohash_encode(latitude, longitude, suggestion_cache.precision)
+        cache_key = (cell, max_distance_km, max_vessels_per_hotspot, limit)
+        cached = suggestion_cache.get(cache_key) if suggestion_cache.enabled else None
+        latest_hotspots = None
+        if cached is not None:
+            # Distances are always reported from the caller's exact position; the
+            # list was selected around another point of the cell, so an entry may
+            # be out of this caller's range
+            latest_hotspots = with_distances(cached, latitude, longitude)
+            if any(hotspot["distanceKm"] > max_distance_km for hotspot in latest_hotspots):
+                latest_hotspots = None  # answered exactly below, without replacing the entry
+        if latest_hotspots is None:
+            if SUGGESTION_TILES and limit <= TILE_SIZE:
+                # Precomputed tile + live occupancy of its few candidates (None: tile can't answer)
+                latest_hotspots = await run_db(
+                    suggest_from_tile, latitude, longitude, max_distance_km, max_vessels_per_hotspot, limit
+                )
+            if latest_hotspots is None:
+                latest_hotspots = await async_fishing_locations.aggregate(build_suggestion_pipeline(
+                    latitude, longitude, max_distance_km, max_vessels_per_hotspot, limit
+                ))
+            if suggestion_cache.enabled and cached is None:
+                suggestion_cache.put(cache_key, cell, max_distance_km, latest_hotspots)
+            latest_hotspots = with_distances(latest_hotspots, latitude, longitude)
 
-        # Limit to the latest 3 locations
-        latest_hotspots = available_hotspots[:3]
+        # If no hotspot is available, return an empty list
+        if not latest_hotspots:
+            return {"status": "success", "message": "No active fishing hotspots available.", "data": []}
 
         return {
             "status": "success",
@@ -87,3 +115,8 @@ async def suggest_fishing_hotspots(
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+@router.get("/suggest_fishing_hotspots/cache_stats")
+async def suggestion_cache_stats():
+    """Hit/miss counters of the suggestion cache."""
+    return {"status": "success", "data": suggestion_cache.snapshot()}
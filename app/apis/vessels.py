@@ -1,8 +1,17 @@
-from fastapi import APIRouter, HTTPException
+import os
+from collections import Counter
+from fastapi import APIRouter, HTTPException, Query
 from datetime import datetime
-from ..database import hotspots_vessels, fishing_locations, vessels_locations
-from ..models import LinkVesselHotspotRequest,VesselLocationRequest, UnlinkVesselHotspotRequest
-from ..utils import parse_location_data
+from typing import List, Union
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from ..database import async_hotspots_vessels, async_fishing_locations, async_vessels_locations, async_vessel_latest, vessels_locations, run_db
+from ..models import LinkVesselHotspotRequest,VesselLocationRequest, UnlinkVesselHotspotRequest, VesselLocationBatchRequest
+from ..utils import parse_location_data, parse_location_batch
+from ..ingest import WRITE_BEHIND_ENABLED, vessel_write_buffer, insert_vessel_locations, record_saved_locations
+from ..streaming import stream_documents, parse_keyset_cursor
+from ..cache import suggestion_cache
+from ..occupancy import reserve_slot, release_slots
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -15,14 +24,18 @@ async def link_vessel_to_hotspot(request: LinkVesselHotspotRequest):
     try:
         vessel_id, hotspot_id = request.vessel_id, request.hotspot_id
 
-        # Check if the hotspot exists
-        if not fishing_locations.find_one({"hotspotId": hotspot_id}):
-            raise HTTPException(status_code=404, detail=f"hotspotId {hotspot_id} not found")
-
         # Check if the vessel is already linked to the hotspot with status=1
-        if hotspots_vessels.find_one({"vesselId": vessel_id, "hotspotId": hotspot_id, "status": 1}):
+        if await async_hotspots_vessels.find_one({"vesselId": vessel_id, "hotspotId": hotspot_id, "status": 1}):
             return {"status": "failed", "message": f"Vessel {vessel_id} already linked to hotspot {hotspot_id}."}
 
+        # Atomically take a slot; fails when the hotspot is missing or full
+        max_vessels_per_hotspot = int(os.getenv("MAX_VESSELS_PER_HOTSPOT", 5))
+        if not await run_db(reserve_slot, hotspot_id, max_vessels_per_hotspot):
+            # Check if the hotspot exists
+            if not await async_fishing_locations.find_one({"hotspotId": hotspot_id}, {"_id": 1}):
+                raise HTTPException(status_code=404, detail=f"hotspotId {hotspot_id} not found")
+            return {"status": "failed", "message": f"Hotspot {hotspot_id} is full ({max_vessels_per_hotspot} vessels)."}
+
         # Prepare data for saving
         data = {
             "vesselId": vessel_id,
@@ -32,7 +45,16 @@ async def link_vessel_to_hotspot(request: LinkVesselHotspotRequest):
         }
 
         # Insert the data into the hotspots_vessels collection
-        result = hotspots_vessels.insert_one(data)
+        try:
+            result = await async_hotspots_vessels.insert_one(data)
+        except DuplicateKeyError:
+            # A concurrent request linked the same vessel first
+            await run_db(release_slots, {hotspot_id: 1})
+            return {"status": "failed", "message": f"Vessel {vessel_id} already linked to hotspot {hotspot_id}."}
+        except Exception:
+            await run_db(release_slots, {hotspot_id: 1})
+            raise
+        await run_db(suggestion_cache.invalidate_hotspots, [hotspot_id])
 
         # Convert the ObjectId to string for the response
         response_data = {**data, "_id": str(result.inserted_id)}
@@ -52,25 +74,33 @@ async def unlink_vessel_to_hotspot(request: UnlinkVesselHotspotRequest):
     try:
         vessel_id = request.vessel_id
 
-        # How many active links does this vessel have?
-        link_count = hotspots_vessels.count_documents(
-            {"vesselId": vessel_id, "status": 1}
+        # Which hotspots does this vessel hold an active link to?
+        links = await async_hotspots_vessels.find(
+            {"vesselId": vessel_id, "status": 1}, {"hotspotId": 1}
         )
-        if link_count == 0:
+        if not links:
             return {
                 "status": "failed",
                 "message": f"No active hotspot links found for vessel {vessel_id}."
             }
 
-        # Deactivate them
-        result = hotspots_vessels.update_many(
-            {"vesselId": vessel_id, "status": 1},
-            {"$set": {"status": 0, "unlinkedDateTime": datetime.now().isoformat()}}
-        )
+        # Deactivate them one by one, so each slot is released exactly once
+        # even if check_vessel_activity deactivates the same link concurrently
+        unlinked_at = datetime.now().isoformat()
+        released = []
+        for link in links:
+            if await async_hotspots_vessels.find_one_and_update(
+                {"_id": link["_id"], "status": 1},
+                {"$set": {"status": 0, "unlinkedDateTime": unlinked_at}},
+                projection={"_id": 1},
+            ):
+                released.append(link["hotspotId"])
+        await run_db(release_slots, Counter(released))
+        await run_db(suggestion_cache.invalidate_hotspots, set(released))
 
         return {
             "status": "success",
-            "message": f"{result.modified_count} hotspot link(s) unlinked for vessel {vessel_id}."
+            "message": f"{len(released)} hotspot link(s) unlinked for vessel {vessel_id}."
         }
 
     except HTTPException as e:
@@ -90,16 +120,30 @@ async def save_vessel_location(request: VesselLocationRequest):
         # Parse the request to extract vessel ID and location
         vessel_id, message_id, latitude, longitude = parse_location_data(request)
 
-        # Prepare the data to be saved
+        # Prepare the data to be saved (ts is the BSON date used by TTL/rollups)
+        now = datetime.now()
         data = {
             "vesselId": vessel_id,
-            "dateTime": datetime.now().isoformat(),
+            "dateTime": now.isoformat(),
+            "ts": now,
             "lat": latitude,
             "lng": longitude,
         }
 
+        if WRITE_BEHIND_ENABLED:
+            # Queue the point for the background flusher and answer right away
+            data["_id"] = ObjectId()
+            if not vessel_write_buffer.put(data):
+                raise HTTPException(status_code=429, detail="Vessel location queue is full, retry later.")
+            return {
+                "status": "success",
+                "message": "Vessel location queued.",
+                "data": {**data, "_id": str(data["_id"])},
+            }
+
         # Insert the data into the vessels_locations collection
-        result = vessels_locations.insert_one(data)
+        result = await async_vessels_locations.insert_one(data)
+        await run_db(record_saved_locations, [data])
 
         # Convert ObjectId to string for the response
         response_data = {**data, "_id": str(result.inserted_id)}
@@ -118,23 +162,154 @@ async def save_vessel_location(request: VesselLocationRequest):
             status_code=500, detail=f"An unexpected error occurred: {str(e)}"
         )
 
+@router.post("/save_vessel_locations/batch")
+async def save_vessel_locations_batch(
+    request: Union[List[VesselLocationRequest], VesselLocationBatchRequest]
+):
+    """
+    Save a burst of vessel locations with a single unordered insert_many.
+    Accepts a list of {id, l} items or parallel raw `id` / `l` string lists,
+    and reports success or error for every item by its position.
+    """
+    try:
+        if isinstance(request, VesselLocationBatchRequest):
+            ids, locations = request.id, request.l
+            if len(ids) != len(locations):
+                raise HTTPException(status_code=400, detail="'id' and 'l' must have the same length")
+        else:
+            ids = [item.id for item in request]
+            locations = [item.l for item in request]
+
+        rows, errors = parse_location_batch(ids, locations)
+
+        now = datetime.now()
+        documents = [
+            {"vesselId": vessel_id, "dateTime": now.isoformat(), "ts": now, "lat": latitude, "lng": longitude}
+            for _, vessel_id, _, latitude, longitude in rows
+        ]
+
+        write_errors = await run_db(insert_vessel_locations, documents)
+        for position, message in write_errors.items():
+            errors[rows[position][0]] = message
+
+        results = [None] * len(ids)
+        for (index, *_), document in zip(rows, documents):
+            if index not in errors:
+                results[index] = {"index": index, "status": "success", "_id": str(document["_id"])}
+        for index, message in errors.items():
+            results[index] = {"index": index, "status": "failed", "error": message}
+
+        saved = len(ids) - len(errors)
+        return {
+            "status": "success" if saved else "failed",
+            "message": f"{saved} of {len(ids)} vessel location(s) saved.",
+            "saved": saved,
+            "failed": len(errors),
+            "results": results,
+        }
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred: {str(e)}"
+        )
+
+@router.get("/vessel_ingest_stats")
+async def vessel_ingest_stats():
+    """
+    Counters of the write-behind vessel location buffer.
+    """
+    return {
+        "status": "success",
+        "data": {
+            "enabled": WRITE_BEHIND_ENABLED,
+            "queueDepth": vessel_write_buffer.depth,
+            "queueCapacity": vessel_write_buffer.max_size,
+            **vessel_write_buffer.stats,
+        },
+    }
+
+@router.get("/vessels/latest")
+async def get_latest_vessel_positions(
+    vesselId: str = Query(None, description="Only this vessel"),
+    since: str = Query(None, description="Only vessels seen at or after this ISO datetime"),
+    include_recent: bool = Query(False, description="Include the rolling window of recent positions"),
+):
+    """
+    Latest known position, last-seen time and report count of every vessel,
+    read from the vessel_latest collection.
+    """
+    try:
+        query = {}
+        if vesselId:
+            query["_id"] = vesselId
+        if since:
+            query["lastSeen"] = {"$gte": since}
+        projection = {"_id": 0}
+        if not include_recent:
+            projection["recent"] = 0
+
+        vessels = await async_vessel_latest.find(query, projection, sort=[("vesselId", 1)])
+
+        return {"status": "success", "data": vessels}
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred: {str(e)}"
+        )
+
 @router.get("/get_all_vessel_locations")
-async def get_all_vessel_locations():
+async def get_all_vessel_locations(
+    vesselId: str = Query(None, description="Only this vessel's locations"),
+    start: str = Query(None, description="Only locations at or after this ISO datetime"),
+    end: str = Query(None, description="Only locations at or before this ISO datetime"),
+    bbox: str = Query(None, description="minLng,minLat,maxLng,maxLat"),
+    fields: str = Query(None, description="Comma-separated fields to return, e.g. vesselId,lat,lng"),
+    limit: int = Query(0, ge=0, description="Page size (0 = everything)"),
+    after: str = Query(None, description="Keyset cursor: 'next' of the previous page, or '<dateTime>|<_id>' of its last record"),
+    format: str = Query("json", regex="^(json|ndjson)$", description="json (default) or ndjson"),
+):
     """
-    Retrieve all vessel locations from the vessels_locations collection.
+    Retrieve vessel locations from the vessels_locations collection.
+    The response is streamed from the database cursor in (dateTime, _id) order.
     """
     try:
-        # Retrieve all documents from the collection
-        vessel_locations = list(vessels_locations.find())
+        query = {}
+        if vesselId:
+            query["vesselId"] = vesselId
+        if start or end:
+            query["dateTime"] = {}
+            if start:
+                query["dateTime"]["$gte"] = start
+            if end:
+                query["dateTime"]["$lte"] = end
+        if bbox:
+            try:
+                min_lng, min_lat, max_lng, max_lat = map(float, bbox.split(","))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid format for 'bbox'")
+            query["lat"] = {"$gte": min_lat, "$lte": max_lat}
+            query["lng"] = {"$gte": min_lng, "$lte": max_lng}
+        if after:
+            query = {"$and": [query, parse_keyset_cursor(after, "dateTime")]}
+
+        # dateTime and _id are always returned, they make up the page cursor
+        projection = None
+        if fields:
+            projection = {field.strip(): 1 for field in fields.split(",") if field.strip()}
+            projection["dateTime"] = 1
 
-        # Convert ObjectId to string for each document
-        for location in vessel_locations:
-            location["_id"] = str(location["_id"])
+        cursor = vessels_locations.find(query, projection).sort([("dateTime", 1), ("_id", 1)])
+        if limit:
+            cursor = cursor.limit(limit)
+        cursor = cursor.batch_size(1000)
 
-        # Return the result
-        return {"status": "success", "data": vessel_locations}
+        return stream_documents(cursor, format, sort_field="dateTime", limit=limit)
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"An unexpected error occurred: {str(e)}"
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from .spatial import GridIndex, active_hotspot_index, geohash_bbox, geohash_center
+from .utils import haversine
+
+CENTRE_CELL_DEG = 0.5  # Grid of entry centres; a 50 km search area spans a few cells
+
+
+class SuggestionCache:
+    """
+    TTL + LRU cache of suggest_fishing_hotspots results, keyed by a geohash
+    cell of the caller's position plus the query settings.
+
+    Entries remember how far from their cell's centre their search area
+    reaches (radius + half the cell diagonal) and the hotspots they list, so
+    a change to a hotspot drops exactly the entries whose search area could
+    contain it. Centres are kept in a grid, so an invalidation only measures
+    the entries around the changed point.
+    """
+
+    def __init__(self, ttl_seconds, max_entries, precision):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.precision = precision
+        self._entries = OrderedDict()  # key -> (expires_at, reach_m, hotspot_ids, value)
+        self._centres = GridIndex(cell_deg=CENTRE_CELL_DEG)  # key -> centre of its cell
+        self._by_hotspot = {}  # hotspotId -> keys of the entries listing it
+        self._max_reach_m = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    @property
+    def enabled(self):
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def _drop(self, key):
+        """Remove an entry and its index references (lock held)."""
+        entry = self._entries.pop(key)
+        self._centres.remove(key)
+        for hotspot_id in entry[2]:
+            keys = self._by_hotspot.get(hotspot_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_hotspot[hotspot_id]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[3]
+
+    def put(self, key, cell, radius_km, value):
+        hotspot_ids = {item.get("hotspotId") for item in value}
+        min_lat, min_lon, max_lat, max_lon = geohash_bbox(cell)
+        reach_m = radius_km * 1000 + haversine(min_lat, min_lon, max_lat, max_lon) / 2
+        centre = geohash_center(cell)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, reach_m, hotspot_ids, value)
+            self._centres.add(key, *centre)
+            for hotspot_id in hotspot_ids:
+                self._by_hotspot.setdefault(hotspot_id, set()).add(key)
+            self._max_reach_m = max(self._max_reach_m, reach_m)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._centres.clear()
+            self._by_hotspot.clear()
+            self._max_reach_m = 0.0
+
+    def invalidate_near(self, lat, lon):
+        """Drop every entry whose search area (cell + radius) may contain the point."""
+        with self._lock:
+            stale = [
+                key for key, distance in self._centres.query_radius(lat, lon, self._max_reach_m)
+                if distance <= self._entries[key][1]
+            ]
+            for key in stale:
+                self._drop(key)
+            self.stats["invalidations"] += len(stale)
+
+    def invalidate_hotspots(self, hotspot_ids):
+        """Drop entries affected by a change (occupancy, status) of these hotspots."""
+        for hotspot_id in hotspot_ids:
+            point = active_hotspot_index.grid.get(hotspot_id)
+            if point is not None:
+                self.invalidate_near(*point)
+                continue
+            # Position unknown to this worker: drop the entries that list it
+            with self._lock:
+                stale = list(self._by_hotspot.get(hotspot_id, ()))
+                for key in stale:
+                    self._drop(key)
+                self.stats["invalidations"] += len(stale)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "precision": self.precision,
+                **self.stats,
+            }
+
+
+suggestion_cache = SuggestionCache(
+    ttl_seconds=float(os.getenv("SUGGESTION_CACHE_TTL_SECONDS", 10)),
+    max_entries=int(os.getenv("SUGGESTION_CACHE_MAX_ENTRIES", 10000)),
+    precision=int(os.getenv("SUGGESTION_CACHE_PRECISION", 6)),
+)
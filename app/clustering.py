@@ -0,0 +1,153 @@
+import math
+import os
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from .database import fishing_locations
+from .spatial import GridIndex, METERS_PER_DEGREE, HOTSPOT_GEOHASH_PRECISION, geohash_encode
+from .utils import geo_point
+from .tiles import mark_tiles_dirty
+
+# Opt-in: fishing reports near an active hotspot move its centroid instead of being rejected
+HOTSPOT_CLUSTERING = os.getenv("HOTSPOT_CLUSTERING", "false").lower() == "true"
+CLUSTER_RADIUS_METERS = float(os.getenv("HOTSPOT_CLUSTER_RADIUS_METERS", 250))
+MIN_SPREAD_METERS = 10  # Floor of the spread used for density, so 1-2 reports don't score as infinitely dense
+
+# Every hotspot is a cluster of fishing reports summarised by its centroid
+# (centroidLatitude/centroidLongitude, unrounded; latitude/longitude are the
+# rounded copy that is displayed and indexed), reportCount and spreadM2: the
+# sum of squared distances (m²) of the reports from the centroid. Clusters
+# are combined with the parallel form of Welford's algorithm, so merging one
+# report or two whole hotspots is the same operation.
+CLUSTER_PROJECTION = {
+    "hotspotId": 1, "latitude": 1, "longitude": 1, "centroidLatitude": 1, "centroidLongitude": 1,
+    "reportCount": 1, "spreadM2": 1,
+}
+
+
+def _offset_m(lat, lon, origin_lat, origin_lon):
+    """(north, east) offset in metres of a point from an origin (equirectangular, fine at cluster scale)."""
+    north = (lat - origin_lat) * METERS_PER_DEGREE
+    east = (lon - origin_lon) * METERS_PER_DEGREE * math.cos(math.radians(origin_lat))
+    return north, east
+
+
+def density(report_count, spread_m):
+    """Reports per km² within the cluster's RMS radius."""
+    radius = max(spread_m, MIN_SPREAD_METERS)
+    return report_count / (math.pi * radius * radius / 1e6)
+
+
+def centroid(cluster):
+    """Exact centroid of a cluster; hotspots and reports without one only have the rounded position."""
+    return (
+        float(cluster.get("centroidLatitude", cluster["latitude"])),
+        float(cluster.get("centroidLongitude", cluster["longitude"])),
+    )
+
+
+def cluster_fields(latitude, longitude, report_count=1, spread_m2=0.0):
+    """Every stored field derived from a cluster's centroid and statistics."""
+    # Only the copies are rounded: a rounded running mean stops moving once
+    # one report shifts it by less than the rounding step
+    rounded_lat, rounded_lon = round(latitude, 5), round(longitude, 5)
+    spread = math.sqrt(spread_m2 / report_count) if report_count else 0.0
+    return {
+        "latitude": rounded_lat,
+        "longitude": rounded_lon,
+        "centroidLatitude": latitude,
+        "centroidLongitude": longitude,
+        "location": geo_point(rounded_lat, rounded_lon),
+        "geohash": geohash_encode(rounded_lat, rounded_lon, HOTSPOT_GEOHASH_PRECISION),
+        "reportCount": report_count,
+        "spreadM2": spread_m2,
+        "spreadMeters": round(spread, 1),
+        "density": round(density(report_count, spread), 2),
+    }
+
+
+def combine(a, b):
+    """Fields of the cluster made of clusters `a` and `b` (documents or report dicts)."""
+    a_lat, a_lon = centroid(a)
+    b_lat, b_lon = centroid(b)
+    a_count, b_count = a.get("reportCount") or 1, b.get("reportCount") or 1
+    count = a_count + b_count
+    north, east = _offset_m(b_lat, b_lon, a_lat, a_lon)
+    spread_m2 = (a.get("spreadM2") or 0.0) + (b.get("spreadM2") or 0.0) \
+        + (north * north + east * east) * a_count * b_count / count
+    return cluster_fields(
+        a_lat + (b_lat - a_lat) * b_count / count,
+        a_lon + (b_lon - a_lon) * b_count / count,
+        count,
+        spread_m2,
+    )
+
+
+def merge_report(hotspot_id, latitude, longitude, retries=5):
+    """
+    Fold one fishing report into an active hotspot. Optimistic: the update
+    only applies if no other report was merged in between, else it retries.
+    Returns the updated hotspot, or None if it is no longer active.
+    """
+    report = {"latitude": latitude, "longitude": longitude}
+    for _ in range(retries):
+        doc = fishing_locations.find_one({"hotspotId": hotspot_id, "status": "active"}, CLUSTER_PROJECTION)
+        if doc is None:
+            return None
+        fields = combine(doc, report)
+        fields["lastReportDateTime"] = datetime.now()
+        fields["lastUsedDateTime"] = datetime.utcnow()
+        updated = fishing_locations.find_one_and_update(
+            {"_id": doc["_id"], "status": "active", "reportCount": doc.get("reportCount")},
+            {"$set": fields},
+            return_document=ReturnDocument.AFTER,
+        )
+        if updated is not None:
+            return updated
+    raise RuntimeError(f"Hotspot {hotspot_id} is too busy to merge the report, retry later")
+
+
+def compact_hotspots(radius_m=CLUSTER_RADIUS_METERS):
+    """
+    One-shot merge of existing active hotspots that lie within `radius_m` of
+    a bigger one (e.g. the chains of 20 m neighbours left by radius dedup).
+    Absorbed hotspots keep their document with status "merged" and a
+    `mergedInto` hotspotId; hotspots with active vessel links are kept.
+    """
+    cursor = fishing_locations.find(
+        {"status": "active"}, {**CLUSTER_PROJECTION, "vesselCount": 1}
+    ).sort([("reportCount", -1), ("hotspotId", 1)])
+
+    kept = GridIndex(cell_deg=max(radius_m, 1.0) / METERS_PER_DEGREE)
+    clusters, origins, changed, absorbed = {}, {}, set(), {}
+    for doc in cursor:
+        hits = kept.query_radius(float(doc["latitude"]), float(doc["longitude"]), radius_m)
+        if hits and not doc.get("vesselCount"):
+            target_id = min(hits, key=lambda hit: hit[1])[0]
+            clusters[target_id].update(combine(clusters[target_id], doc))
+            kept.add(target_id, clusters[target_id]["latitude"], clusters[target_id]["longitude"])
+            changed.add(target_id)
+            absorbed[doc["hotspotId"]] = target_id
+            continue
+        clusters[doc["hotspotId"]] = doc
+        origins[doc["hotspotId"]] = (float(doc["latitude"]), float(doc["longitude"]))
+        kept.add(doc["hotspotId"], float(doc["latitude"]), float(doc["longitude"]))
+
+    operations = [
+        UpdateOne({"hotspotId": hotspot_id}, {"$set": cluster_fields(
+            *centroid(clusters[hotspot_id]),
+            clusters[hotspot_id].get("reportCount") or 1, clusters[hotspot_id].get("spreadM2") or 0.0,
+        )})
+        for hotspot_id in changed
+    ]
+    operations += [
+        UpdateOne({"hotspotId": hotspot_id, "status": "active"},
+                  {"$set": {"status": "merged", "mergedInto": target_id}})
+        for hotspot_id, target_id in absorbed.items()
+    ]
+    if operations:
+        fishing_locations.bulk_write(operations, ordered=False)
+        # Kept hotspots moved: tiles around their old and new centres list them
+        mark_tiles_dirty([origins[hotspot_id] for hotspot_id in changed]
+                         + [(clusters[hotspot_id]["latitude"], clusters[hotspot_id]["longitude"]) for hotspot_id in changed])
+    print(f"[Clustering] compact_hotspots – {len(absorbed)} hotspot(s) merged into {len(changed)}.")
+    return absorbed
@@ -1,6 +1,10 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, GEOSPHERE
+from pymongo.errors import OperationFailure
 import os
+from functools import partial
+from anyio import CapacityLimiter, to_thread
 from dotenv import load_dotenv
+from .metrics import mongo_command_listener
 
 # Load environment variables
 load_dotenv()
@@ -10,10 +14,125 @@ mongodb_url = os.getenv("MONGODB_URL")
 if not mongodb_url:
     raise ValueError("MONGODB_URL is not set in the environment variables")
 
-client = MongoClient(mongodb_url)
-db = client['aquasafe']
+# Connection pool settings (see .example.env)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+
+client = MongoClient(
+    mongodb_url,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+    maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000)),
+    waitQueueTimeoutMS=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000)),
+    serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 30000)),
+    connectTimeoutMS=int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 20000)),
+    socketTimeoutMS=int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 0)) or None,
+    event_listeners=[mongo_command_listener],
+)
+db = client[os.getenv("MONGODB_DB", "aquasafe")]
 
 # Collections
 fishing_locations = db['fishing_hotspots_locations']
 hotspots_vessels = db['hotspots_vessels']
 vessels_locations = db['vessels_locations']
+counters = db['counters']
+vessel_latest = db['vessel_latest']
+vessels_locations_rollup = db['vessels_locations_rollup']
+scheduler_leases = db['scheduler_leases']
+suggestion_tiles = db['suggestion_tiles']
+
+# Every collection the app owns (the time-series migration keeps the old
+# locations as <name>_legacy); tools writing scratch data must stay out of them
+APP_COLLECTIONS = frozenset(
+    [collection.name for collection in (
+        fishing_locations, hotspots_vessels, vessels_locations, counters, vessel_latest,
+        vessels_locations_rollup, scheduler_leases, suggestion_tiles,
+    )] + [f"{vessels_locations.name}_legacy"]
+)
+
+
+# ------------------------------------------------------------
+# Async access for the API layer ------------------------------
+#
+# pymongo is blocking, so the routers await these wrappers, which run each
+# call on a worker thread. The number of threads is capped at the connection
+# pool size, so every in-flight call can hold a pooled connection and the
+# event loop is never blocked by a slow query.
+
+_db_limiter = None
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database function on the DB thread pool."""
+    global _db_limiter
+    if _db_limiter is None:
+        _db_limiter = CapacityLimiter(MONGO_MAX_POOL_SIZE)
+    return await to_thread.run_sync(partial(func, *args, **kwargs), limiter=_db_limiter)
+
+
+class AsyncCollection:
+    """
+    Awaitable facade over a pymongo collection. Methods return what pymongo
+    returns, except find() and aggregate(), which return materialized lists.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return await run_db(method, *args, **kwargs)
+        return call
+
+    async def find(self, *args, sort=None, limit=0, **kwargs):
+        def fetch():
+            cursor = self.collection.find(*args, **kwargs)
+            if sort:
+                cursor = cursor.sort(sort)
+            return list(cursor.limit(limit))
+        return await run_db(fetch)
+
+    async def aggregate(self, pipeline, **kwargs):
+        return await run_db(lambda: list(self.collection.aggregate(pipeline, **kwargs)))
+
+
+async_fishing_locations = AsyncCollection(fishing_locations)
+async_hotspots_vessels = AsyncCollection(hotspots_vessels)
+async_vessels_locations = AsyncCollection(vessels_locations)
+async_vessel_latest = AsyncCollection(vessel_latest)
+
+
+# When enabled, radius/proximity checks run inside MongoDB on the 2dsphere index
+USE_GEO_QUERIES = os.getenv("USE_GEO_QUERIES", "false").lower() == "true"
+
+
+def ensure_indexes():
+    """Create the indexes the API and scheduler queries rely on (idempotent)."""
+    fishing_locations.create_index([("location", GEOSPHERE)])
+    fishing_locations.create_index([("status", ASCENDING), ("hotspotId", ASCENDING)])
+    fishing_locations.create_index([("status", ASCENDING), ("lastUsedDateTime", ASCENDING)])
+    fishing_locations.create_index([("currentDateTime", ASCENDING), ("_id", ASCENDING)])
+    try:
+        fishing_locations.create_index([("hotspotId", ASCENDING)], unique=True)
+    except OperationFailure as e:
+        # Duplicate ids handed out by the old allocator must be fixed by hand first
+        print(f"[Database] unique hotspotId index not created: {e}")
+    vessels_locations.create_index([("vesselId", ASCENDING), ("dateTime", ASCENDING)])
+    # Keyset pages of get_all_vessel_locations sort on (dateTime, _id), with or without a vesselId filter
+    vessels_locations.create_index([("dateTime", ASCENDING), ("_id", ASCENDING)])
+    vessels_locations.create_index([("vesselId", ASCENDING), ("dateTime", ASCENDING), ("_id", ASCENDING)])
+    hotspots_vessels.create_index([("hotspotId", ASCENDING), ("status", ASCENDING)])
+    try:
+        # One active link per vessel and hotspot
+        hotspots_vessels.create_index(
+            [("vesselId", ASCENDING), ("hotspotId", ASCENDING)],
+            unique=True, partialFilterExpression={"status": 1},
+        )
+    except OperationFailure as e:
+        print(f"[Database] unique active link index not created: {e}")
+    vessel_latest.create_index([("lastSeen", ASCENDING)])
+    # Expired scheduler leases are cleaned up by MongoDB (expiry is also checked on acquire)
+    scheduler_leases.create_index([("expiresAt", ASCENDING)], expireAfterSeconds=0)
+    suggestion_tiles.create_index([("dirty", ASCENDING)])
+    print("[Database] indexes ensured")
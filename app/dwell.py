@@ -0,0 +1,305 @@
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from pymongo.errors import PyMongoError
+from .database import vessels_locations, vessel_latest
+from .hotspot_service import create_hotspots
+from .leader import LEADER_ELECTION_ENABLED, job_leases
+from .spatial import METERS_PER_DEGREE
+from .utils import haversine
+
+# Where fishing is detected: "off" (the scan_fishing_activity job), "inline"
+# (locations saved by this process, single API process only) or
+# "changestream" (every insert into vessels_locations, followed by the
+# scheduler leader; needs a replica set and a regular collection)
+DWELL_DETECTION = os.getenv("DWELL_DETECTION", "off").strip().lower()
+DWELL_DETECTION_MODES = ("off", "inline", "changestream")
+if DWELL_DETECTION not in DWELL_DETECTION_MODES:
+    # A typo must not leave the deployment without any fishing detection
+    print(f"[Dwell] WARNING: unknown DWELL_DETECTION={DWELL_DETECTION!r} (expected one of "
+          f"{', '.join(DWELL_DETECTION_MODES)}) – falling back to 'off', the scan_fishing_activity job")
+    DWELL_DETECTION = "off"
+DWELL_RADIUS_METERS = float(os.getenv("DWELL_RADIUS_METERS", 500))
+DWELL_MINUTES = float(os.getenv("DWELL_MINUTES", 60))
+DWELL_MAX_GAP_MINUTES = float(os.getenv("DWELL_MAX_GAP_MINUTES", 15))
+DWELL_BUFFER_SIZE = int(os.getenv("DWELL_BUFFER_SIZE", 128))
+MIN_DWELL_POINTS = 3
+SMALL_TRACK = 32  # Up to this many buffered points, plain Python beats numpy's per-call overhead
+
+
+def _planar_m(lat1, lon1, lat2, lon2):
+    """Equirectangular distance in metres: exact enough within a dwell, and cheap."""
+    return METERS_PER_DEGREE * math.hypot(lat2 - lat1, (lon2 - lon1) * math.cos(math.radians(lat2)))
+
+
+class VesselTrack:
+    """
+    Ring buffer of a vessel's latest positions, trimmed so that every
+    buffered point lies within the dwell radius of their centroid. The
+    buffer is therefore the vessel's current dwell; `since` is when it began
+    (kept when a full buffer overwrites its oldest point).
+    """
+
+    __slots__ = ("lat", "lon", "t", "start", "count", "since", "sum_lat", "sum_lon", "spread", "emitted_at")
+
+    def __init__(self, capacity):
+        self.lat = np.empty(capacity, dtype=np.float32)
+        self.lon = np.empty(capacity, dtype=np.float32)
+        self.t = np.empty(capacity, dtype=np.float64)
+        self.start = self.count = 0
+        self.since = None
+        self.sum_lat = self.sum_lon = 0.0
+        self.spread = 0.0
+        self.emitted_at = None  # Centroid of the last event, until the vessel leaves it
+
+    @property
+    def last_time(self):
+        return float(self.t[(self.start + self.count - 1) % len(self.t)]) if self.count else None
+
+    def centroid(self):
+        return self.sum_lat / self.count, self.sum_lon / self.count
+
+    def _distances(self, lat, lon):
+        """Distances (m) of the buffered points, oldest first, to a position."""
+        capacity = len(self.t)
+        scale = math.cos(math.radians(lat))
+        if self.count <= SMALL_TRACK:
+            lats, lons = self.lat.tolist(), self.lon.tolist()
+            return [METERS_PER_DEGREE * math.hypot(lats[slot] - lat, (lons[slot] - lon) * scale)
+                    for slot in ((self.start + i) % capacity for i in range(self.count))]
+        slots = (self.start + np.arange(self.count)) % capacity
+        return (METERS_PER_DEGREE * np.hypot(self.lat[slots] - lat, (self.lon[slots] - lon) * scale)).tolist()
+
+    def _drop_oldest(self, n):
+        if n == 1:
+            self.sum_lat -= float(self.lat[self.start])
+            self.sum_lon -= float(self.lon[self.start])
+        else:
+            dropped = (self.start + np.arange(n)) % len(self.t)
+            self.sum_lat -= float(self.lat[dropped].sum(dtype=np.float64))
+            self.sum_lon -= float(self.lon[dropped].sum(dtype=np.float64))
+        self.start = (self.start + n) % len(self.t)
+        self.count -= n
+
+    def add(self, t, lat, lon, radius_m, max_gap_seconds):
+        """Append a position; False if it is not newer than the last one."""
+        last = self.last_time
+        if last is not None:
+            if t <= last:
+                return False
+            if t - last > max_gap_seconds:
+                # Silent too long: whatever it did in between is unknown
+                self._drop_oldest(self.count)
+        previous = self.centroid() if self.count else None
+        if self.count == len(self.t):
+            self._drop_oldest(1)
+        slot = (self.start + self.count) % len(self.t)
+        self.lat[slot], self.lon[slot], self.t[slot] = lat, lon, t
+        self.sum_lat += float(self.lat[slot])
+        self.sum_lon += float(self.lon[slot])
+        self.count += 1
+        if self.count == 1:
+            self.since = t
+            self.spread = 0.0
+            return True
+
+        # Fast path: no old point moved further from the centroid than the
+        # centroid itself moved, so the old spread plus that shift bounds them
+        centroid = self.centroid()
+        bound = self.spread + _planar_m(*previous, *centroid)
+        distance = _planar_m(lat, lon, *centroid)
+        if bound <= radius_m and distance <= radius_m:
+            self.spread = max(bound, distance)
+            return True
+
+        # Points over 2R from the new one can't share an R circle with it
+        far = [i for i, distance in enumerate(self._distances(lat, lon)) if distance > 2 * radius_m]
+        if far:
+            self._drop_oldest(far[-1] + 1)
+            self.since = float(self.t[self.start])
+        # Then shrink from the oldest end until the bounding radius fits
+        while True:
+            self.spread = max(self._distances(*self.centroid()))
+            if self.spread <= radius_m:
+                break
+            self._drop_oldest(1)
+            self.since = float(self.t[self.start])
+        return True
+
+
+class DwellDetector:
+    """
+    Streaming fishing detector: one VesselTrack per vessel, fed with new
+    positions only. A vessel that stays within `radius_m` of one spot for
+    `dwell_seconds` produces an event at the centre of its dwell; it can
+    produce the next one once it has left that spot.
+    """
+
+    def __init__(self, radius_m, dwell_seconds, max_gap_seconds, capacity):
+        self.radius_m = radius_m
+        self.dwell_seconds = dwell_seconds
+        self.max_gap_seconds = max_gap_seconds
+        self.capacity = capacity
+        self.tracks = {}
+        self._lock = threading.Lock()
+        self._newest = 0.0
+        self._swept = 0.0
+        self.stats = {"points": 0, "ignored": 0, "events": 0, "evicted": 0}
+
+    def feed(self, points, emit=True):
+        """
+        Fold (vesselId, unix time, lat, lon) points in; returns the fishing
+        events they complete. With emit=False (warm-up) dwells that already
+        qualify are only marked as reported.
+        """
+        events = []
+        with self._lock:
+            for vessel_id, t, lat, lon in sorted(points, key=lambda point: point[1]):
+                track = self.tracks.get(vessel_id)
+                if track is None:
+                    track = self.tracks[vessel_id] = VesselTrack(self.capacity)
+                if not track.add(t, lat, lon, self.radius_m, self.max_gap_seconds):
+                    self.stats["ignored"] += 1
+                    continue
+                self.stats["points"] += 1
+                self._newest = max(self._newest, t)
+
+                if track.emitted_at is not None and haversine(*track.emitted_at, lat, lon) > self.radius_m:
+                    track.emitted_at = None
+                if (track.emitted_at is None and track.count >= MIN_DWELL_POINTS
+                        and t - track.since >= self.dwell_seconds):
+                    track.emitted_at = track.centroid()
+                    if emit:
+                        self.stats["events"] += 1
+                        events.append({
+                            "vesselId": vessel_id,
+                            "time": t,
+                            "latitude": round(track.emitted_at[0], 5),
+                            "longitude": round(track.emitted_at[1], 5),
+                            "minutes": (t - track.since) / 60,
+                            "radiusM": track.spread,
+                            "points": track.count,
+                        })
+
+            if self._newest - self._swept > self.max_gap_seconds:
+                self._sweep()
+        return events
+
+    def _sweep(self):
+        """Forget vessels silent for longer than the gap that resets a dwell anyway."""
+        cutoff = self._newest - self.max_gap_seconds
+        idle = [vessel_id for vessel_id, track in self.tracks.items() if track.last_time < cutoff]
+        for vessel_id in idle:
+            del self.tracks[vessel_id]
+        self.stats["evicted"] += len(idle)
+        self._swept = self._newest
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, "vessels": len(self.tracks)}
+
+
+dwell_detector = DwellDetector(
+    DWELL_RADIUS_METERS, DWELL_MINUTES * 60, DWELL_MAX_GAP_MINUTES * 60, DWELL_BUFFER_SIZE
+)
+
+
+def _timestamp(document):
+    # ts is the BSON date saved with every location; older points only have dateTime
+    moment = document.get("ts") or datetime.fromisoformat(document["dateTime"])
+    return moment.timestamp()
+
+
+def location_points(documents):
+    return [
+        (document["vesselId"], _timestamp(document), float(document["lat"]), float(document["lng"]))
+        for document in documents
+    ]
+
+
+def save_dwell_events(events):
+    """Create a hotspot for every fishing event; returns the number created."""
+    candidates = [
+        {"vesselId": event["vesselId"], "messageId": None,
+         "latitude": event["latitude"], "longitude": event["longitude"], "f": 1}
+        for event in events
+    ]
+    created = 0
+    for event, result in zip(events, create_hotspots(candidates)):
+        if result["status"] == "success" and not result.get("merged"):
+            created += 1
+            print(f"[Dwell] Fishing spot {result['data']['hotspotId']} saved for vessel {event['vesselId']} "
+                  f"(stayed {event['minutes']:.0f} min within {event['radiusM']:.0f} m)")
+    return created
+
+
+def feed_saved_locations(documents):
+    """Run freshly saved vessel locations through the detector; never fails the save."""
+    try:
+        events = dwell_detector.feed(location_points(documents))
+        if events:
+            save_dwell_events(events)
+    except Exception as e:
+        print(f"[Dwell] detection failed for {len(documents)} location(s): {e}")
+
+
+def warm_dwell_detector():
+    """Load the recent track of every vessel from vessel_latest, so a (re)started detector resumes its dwells."""
+    since = (datetime.now() - timedelta(minutes=DWELL_MINUTES + DWELL_MAX_GAP_MINUTES)).isoformat()
+    points = []
+    for doc in vessel_latest.find({"lastSeen": {"$gte": since}}, {"recent": 1}):
+        points += location_points(
+            {**point, "vesselId": doc["_id"]} for point in doc.get("recent", []) if point["dateTime"] >= since
+        )
+    dwell_detector.feed(points, emit=False)
+    print(f"[Dwell] warmed with {len(points)} point(s) of {len(dwell_detector.tracks)} vessel(s)")
+
+
+# ------------------------------------------------------------
+# Change stream mode ------------------------------------------
+
+FOLLOW_BATCH_SIZE = 500
+_follower = None
+_stop_following = threading.Event()
+
+
+def _holds_lease():
+    return not LEADER_ELECTION_ENABLED or "follow_vessel_locations" in job_leases.held
+
+
+def _follow():
+    try:
+        with vessels_locations.watch([{"$match": {"operationType": "insert"}}]) as stream:
+            # Opened first, so nothing saved during the warm-up is missed
+            warm_dwell_detector()
+            batch = []
+            while not _stop_following.is_set() and _holds_lease():
+                change = stream.try_next()
+                if change is not None:
+                    batch.append(change["fullDocument"])
+                    if len(batch) < FOLLOW_BATCH_SIZE:
+                        continue
+                if batch:
+                    feed_saved_locations(batch)
+                    batch = []
+            if batch:
+                feed_saved_locations(batch)
+    except PyMongoError as e:
+        print(f"[Dwell] change stream on {vessels_locations.name} stopped: {e}")
+    print("[Dwell] stopped following vessel locations")
+
+
+def follow_vessel_locations():
+    """Scheduler job: keep the change stream follower running while this worker holds its lease."""
+    global _follower
+    if _follower is None or not _follower.is_alive():
+        _stop_following.clear()
+        _follower = threading.Thread(target=_follow, name="dwell-follower", daemon=True)
+        _follower.start()
+        print("[Dwell] following vessel location inserts")
+
+
+def stop_following():
+    _stop_following.set()
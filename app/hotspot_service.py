@@ -0,0 +1,203 @@
+from datetime import datetime
+from pymongo.errors import BulkWriteError
+from .database import fishing_locations, USE_GEO_QUERIES
+from .spatial import (GridIndex, METERS_PER_DEGREE, LOCATION_RADIUS_METERS, HOTSPOT_GEOHASH_PRECISION,
+                      active_hotspot_index, geohash_encode)
+from .utils import reserve_hotspot_ids, geo_point, valid_position
+from .cache import suggestion_cache
+from .clustering import HOTSPOT_CLUSTERING, CLUSTER_RADIUS_METERS, cluster_fields, combine, merge_report
+from .tiles import mark_tiles_dirty
+
+EARTH_RADIUS_M = 6378100  # Radius $centerSphere expects distances to be divided by
+INVALID_POSITION = "Invalid latitude or longitude."
+
+
+def _near_active_hotspots(candidates, radius_m):
+    """
+    Grid of the active hotspots that could be within `radius_m` of any
+    candidate, fetched with a single $geoWithin query (geo mode only).
+    """
+    grid = GridIndex(cell_deg=max(radius_m, 1.0) / METERS_PER_DEGREE)
+    cursor = fishing_locations.find(
+        {
+            "status": "active",
+            "$or": [
+                {"location": {"$geoWithin": {"$centerSphere": [
+                    [c["longitude"], c["latitude"]], radius_m / EARTH_RADIUS_M
+                ]}}}
+                for c in candidates
+            ],
+        },
+        {"hotspotId": 1, "latitude": 1, "longitude": 1},
+    )
+    for doc in cursor:
+        grid.add(doc["hotspotId"], float(doc["latitude"]), float(doc["longitude"]))
+    return grid
+
+
+def create_hotspots(candidates, radius_m=LOCATION_RADIUS_METERS):
+    """
+    Create fishing hotspots from a batch of candidate points.
+
+    Each candidate is a dict with vesselId, messageId, latitude, longitude and
+    f. Candidates with an invalid position, or within `radius_m` of an active
+    hotspot or of an earlier candidate of the same batch, are rejected; the
+    survivors are written with one unordered insert_many. Returns one result
+    per candidate, in order:
+    {"status": "success", "data": <document>} or {"status": "failed", "message": ...}.
+    """
+    if not candidates:
+        return []
+    if HOTSPOT_CLUSTERING:
+        return cluster_reports(candidates)
+
+    valid = [candidate for candidate in candidates if valid_position(candidate["latitude"], candidate["longitude"])]
+    if USE_GEO_QUERIES and valid:
+        existing = _near_active_hotspots(valid, radius_m)
+
+        def is_taken(lat, lon):
+            return existing.query_radius(lat, lon, radius_m)
+    else:
+        def is_taken(lat, lon):
+            return active_hotspot_index.find_within(lat, lon, radius_m)
+
+    # Survivors of this batch, so near-duplicates inside the batch collapse too
+    accepted = GridIndex(cell_deg=max(radius_m, 1.0) / METERS_PER_DEGREE)
+    results, documents = [], []
+    for index, candidate in enumerate(candidates):
+        lat, lon = candidate["latitude"], candidate["longitude"]
+        if not valid_position(lat, lon):
+            results.append({"status": "failed", "message": INVALID_POSITION})
+            continue
+        if is_taken(lat, lon) or accepted.query_radius(lat, lon, radius_m):
+            results.append({"status": "failed", "message": "Location exists within the radius."})
+            continue
+        accepted.add(index, lat, lon)
+        document = _new_hotspot(candidate)
+        documents.append(document)
+        results.append({"status": "success", "data": document})
+
+    return _failed_inserts(results, documents, _insert_hotspots(documents))
+
+
+def _new_hotspot(candidate):
+    lat, lon = candidate["latitude"], candidate["longitude"]
+    return {
+        "hotspotId": None,  # allocated by _insert_hotspots for the whole batch
+        "vesselId": candidate["vesselId"],
+        "messageId": candidate.get("messageId"),
+        "latitude": lat,
+        "longitude": lon,
+        "location": geo_point(lat, lon),
+        "geohash": geohash_encode(lat, lon, HOTSPOT_GEOHASH_PRECISION),
+        "currentDateTime": datetime.now(),
+        "status": "active",
+        "f": candidate.get("f", 1),
+        "vesselCount": 0,
+        "lastUsedDateTime": datetime.utcnow(),  # BSON date, see deactivate_unused_hotspots
+    }
+
+
+def _insert_hotspots(documents):
+    """
+    Write new hotspots with one unordered insert_many. Returns
+    {position: error} for the documents that failed; the others are written
+    and indexed. The ids of failed documents stay unused.
+    """
+    errors = {}
+    if not documents:
+        return errors
+    first_id = reserve_hotspot_ids(len(documents))
+    for offset, document in enumerate(documents):
+        document["hotspotId"] = first_id + offset
+    try:
+        fishing_locations.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        # Unordered: everything except the reported documents was written
+        for write_error in e.details.get("writeErrors", []):
+            errors[write_error["index"]] = write_error.get("errmsg", "Write failed")
+        print(f"[Hotspots] {len(errors)} of {len(documents)} hotspot(s) could not be saved: "
+              f"{next(iter(errors.values()), e)}")
+    written = [document for position, document in enumerate(documents) if position not in errors]
+    for document in written:
+        active_hotspot_index.add(document)
+        suggestion_cache.invalidate_near(document["latitude"], document["longitude"])
+    mark_tiles_dirty((document["latitude"], document["longitude"]) for document in written)
+    return errors
+
+
+def _failed_inserts(results, documents, errors):
+    """Turn the results whose new hotspot could not be written into failures."""
+    if not errors:
+        return results
+    errors = {id(documents[position]): error for position, error in errors.items()}
+    return [
+        {"status": "failed", "message": errors[id(result["data"])]}
+        if result["status"] == "success" and id(result["data"]) in errors else result
+        for result in results
+    ]
+
+
+def cluster_reports(candidates, radius_m=CLUSTER_RADIUS_METERS):
+    """
+    Clustering counterpart of create_hotspots (HOTSPOT_CLUSTERING=true).
+
+    Each report joins the nearest active hotspot within `radius_m`, or the
+    nearest new hotspot of the same batch, moving its centroid and updating
+    its reportCount, spread and density; reports with no cluster nearby
+    start a new hotspot. Returns one result per candidate, in order:
+    {"status": "success", "merged": <bool>, "data": <hotspot>} or
+    {"status": "failed", "message": ...}.
+    """
+    valid = [candidate for candidate in candidates if valid_position(candidate["latitude"], candidate["longitude"])]
+    if USE_GEO_QUERIES and valid:
+        existing = _near_active_hotspots(valid, radius_m)
+
+        def nearby(lat, lon):
+            return existing.query_radius(lat, lon, radius_m)
+    else:
+        existing = None
+
+        def nearby(lat, lon):
+            return active_hotspot_index.find_within(lat, lon, radius_m)
+
+    pending = GridIndex(cell_deg=max(radius_m, 1.0) / METERS_PER_DEGREE)
+    results, documents = [], []
+    for candidate in candidates:
+        lat, lon = candidate["latitude"], candidate["longitude"]
+        if not valid_position(lat, lon):
+            results.append({"status": "failed", "message": INVALID_POSITION})
+            continue
+        hits = [(hit_id, distance, False) for hit_id, distance in nearby(lat, lon)]
+        hits += [(position, distance, True) for position, distance in pending.query_radius(lat, lon, radius_m)]
+        hotspot = None
+        for key, _, is_new in sorted(hits, key=lambda hit: hit[1]):
+            if is_new:
+                hotspot = documents[key]
+                hotspot.update(combine(hotspot, candidate))
+                pending.add(key, hotspot["latitude"], hotspot["longitude"])
+                break
+            previous = active_hotspot_index.grid.get(key) or (existing.get(key) if existing is not None else None)
+            hotspot = merge_report(key, lat, lon)
+            if hotspot is None:
+                continue  # deactivated meanwhile: try the next cluster
+            if existing is not None:
+                existing.add(key, hotspot["latitude"], hotspot["longitude"])
+            active_hotspot_index.add(hotspot)
+            if previous is not None:
+                suggestion_cache.invalidate_near(*previous)
+            suggestion_cache.invalidate_near(hotspot["latitude"], hotspot["longitude"])
+            mark_tiles_dirty([previous or (lat, lon), (hotspot["latitude"], hotspot["longitude"])])
+            break
+        if hotspot is not None:
+            results.append({"status": "success", "merged": True, "data": hotspot})
+            continue
+
+        document = _new_hotspot(candidate)
+        document.update(cluster_fields(lat, lon))
+        document["lastReportDateTime"] = document["currentDateTime"]
+        pending.add(len(documents), document["latitude"], document["longitude"])
+        documents.append(document)
+        results.append({"status": "success", "merged": False, "data": document})
+
+    return _failed_inserts(results, documents, _insert_hotspots(documents))
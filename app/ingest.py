@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+from pymongo.errors import BulkWriteError
+from .database import vessels_locations, run_db
+from .vessel_latest import update_vessel_latest
+from .dwell import DWELL_DETECTION, feed_saved_locations
+
+# Opt-in: save_vessel_location enqueues points and returns immediately
+WRITE_BEHIND_ENABLED = os.getenv("VESSEL_WRITE_BEHIND", "false").lower() == "true"
+
+
+class WriteBehindBuffer:
+    """
+    Bounded in-process queue of documents flushed to a collection with
+    insert_many once `batch_size` documents are waiting or `flush_seconds`
+    have passed since the first one arrived. `on_flush`, if given, is called
+    (on the DB thread pool) with the documents that were written.
+    """
+
+    def __init__(self, collection, max_size, batch_size, flush_seconds, on_flush=None):
+        self.collection = collection
+        self.on_flush = on_flush
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = None
+        self._task = None
+        self._batch = []
+        self._inflight = None
+        self.stats = {
+            "enqueued": 0,
+            "rejected": 0,
+            "flushed": 0,
+            "failed": 0,
+            "flushes": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+            "total_flush_seconds": 0.0,
+        }
+
+    @property
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        """Start the background flusher (must run inside the event loop)."""
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            print(f"[WriteBehind] started (queue={self.max_size}, batch={self.batch_size}, "
+                  f"interval={self.flush_seconds}s)")
+
+    def put(self, document):
+        """Enqueue a document; returns False when the queue is full."""
+        try:
+            self._queue.put_nowait(document)
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            return False
+        self.stats["enqueued"] += 1
+        return True
+
+    async def _run(self):
+        while True:
+            self._batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(self._batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._batch = self._batch, []
+            # Shielded so a shutdown cancel never abandons a batch mid-write
+            self._inflight = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+
+    async def _flush(self, batch):
+        started = time.perf_counter()
+        written = batch
+        try:
+            await run_db(self.collection.insert_many, batch, ordered=False)
+            self.stats["flushed"] += len(batch)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            written = [document for index, document in enumerate(batch) if index not in failed]
+            self.stats["flushed"] += len(written)
+            self.stats["failed"] += len(failed)
+            print(f"[WriteBehind] flush wrote {len(written)}/{len(batch)} document(s): {e}")
+        except Exception as e:
+            written = []
+            self.stats["failed"] += len(batch)
+            print(f"[WriteBehind] flush of {len(batch)} document(s) failed: {e}")
+        if self.on_flush is not None and written:
+            try:
+                await run_db(self.on_flush, written)
+            except Exception as e:
+                print(f"[WriteBehind] on_flush hook failed: {e}")
+        elapsed = time.perf_counter() - started
+        self.stats["flushes"] += 1
+        self.stats["last_flush_seconds"] = elapsed
+        self.stats["max_flush_seconds"] = max(self.stats["max_flush_seconds"], elapsed)
+        self.stats["total_flush_seconds"] += elapsed
+
+    async def drain(self):
+        """Stop the flusher and write out everything still queued."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._inflight is not None:
+            await self._inflight
+            self._inflight = None
+
+        pending, self._batch = self._batch, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for start in range(0, len(pending), self.batch_size):
+            await self._flush(pending[start:start + self.batch_size])
+        print(f"[WriteBehind] drained {len(pending)} queued document(s)")
+
+
+def insert_vessel_locations(documents):
+    """
+    Write vessel location documents with one unordered insert_many and update
+    vessel_latest with the ones that were written. Returns {position: error}
+    for the documents that failed.
+    """
+    errors = {}
+    if not documents:
+        return errors
+    try:
+        vessels_locations.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        # Unordered: everything except the reported documents was written
+        for write_error in e.details.get("writeErrors", []):
+            errors[write_error["index"]] = write_error.get("errmsg", "Write failed")
+    written = [document for position, document in enumerate(documents) if position not in errors]
+    if written:
+        record_saved_locations(written)
+    return errors
+
+
+def record_saved_locations(documents):
+    """Everything that follows a successful vessel location write."""
+    update_vessel_latest(documents)
+    if DWELL_DETECTION == "inline":
+        feed_saved_locations(documents)
+
+
+vessel_write_buffer = WriteBehindBuffer(
+    vessels_locations,
+    max_size=int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", 10000)),
+    batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 500)),
+    flush_seconds=float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", 1)),
+    on_flush=record_saved_locations,
+)
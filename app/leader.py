@@ -0,0 +1,97 @@
+import functools
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from .database import scheduler_leases
+
+# Only one process runs each scheduler job: the one holding its lease
+LEADER_ELECTION_ENABLED = os.getenv("SCHEDULER_LEADER_ELECTION", "true").lower() == "true"
+LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", 90))
+
+
+class JobLeases:
+    """
+    Per-job leases stored in MongoDB, one document per job:
+    {_id: <job>, owner, expiresAt, renewedAt}.
+
+    A worker takes a job's lease when it is free or expired and keeps it by
+    renewing it (see `renew`) well before `expiresAt`. When the holder dies
+    the lease expires and the next worker whose trigger fires takes over.
+    """
+
+    def __init__(self, collection, lease_seconds):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = set()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, name):
+        """Take or extend the lease of `name`; False when another live worker holds it."""
+        now = datetime.utcnow()
+        try:
+            self.collection.find_one_and_update(
+                {"_id": name, "$or": [{"owner": self.owner}, {"expiresAt": {"$lt": now}}]},
+                {"$set": {
+                    "owner": self.owner,
+                    "expiresAt": now + timedelta(seconds=self.lease_seconds),
+                    "renewedAt": now,
+                }},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # The document exists and is held by someone else
+            self._drop(name)
+            return False
+        with self._lock:
+            if name not in self.held:
+                self.held.add(name)
+                print(f"[Leader] {self.owner} now runs {name}")
+        return True
+
+    def _drop(self, name):
+        with self._lock:
+            if name in self.held:
+                self.held.discard(name)
+                print(f"[Leader] {self.owner} lost {name}")
+
+    def renew(self):
+        """Heartbeat: push back the expiry of every lease this worker holds."""
+        now = datetime.utcnow()
+        with self._lock:
+            held = list(self.held)
+        for name in held:
+            result = self.collection.update_one(
+                {"_id": name, "owner": self.owner},
+                {"$set": {"expiresAt": now + timedelta(seconds=self.lease_seconds), "renewedAt": now}},
+            )
+            if not result.matched_count:
+                self._drop(name)
+        return len(held)
+
+    def release_all(self):
+        """Hand every lease back at shutdown so another worker can take over right away."""
+        with self._lock:
+            held, self.held = list(self.held), set()
+        if held:
+            self.collection.delete_many({"_id": {"$in": held}, "owner": self.owner})
+            print(f"[Leader] {self.owner} released {', '.join(held)}")
+
+
+job_leases = JobLeases(scheduler_leases, LEASE_SECONDS)
+
+
+def leader_only(func):
+    """Run the job only in the worker holding its lease; other workers skip the run."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if LEADER_ELECTION_ENABLED and not job_leases.try_acquire(name):
+            return None
+        return func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,112 @@
+import numpy as np
+from .utils import to_float_array
+
+# Packed binary frame: back-to-back little-endian records, no padding.
+# Coordinates are fixed-point degrees × 1e5, the precision the API keeps.
+WIRE_DTYPE = np.dtype([
+    ("vessel", "<u4"),   # vesselId
+    ("message", "<u2"),  # messageId, rendered zero-padded to 4 digits
+    ("lat", "<i4"),
+    ("lng", "<i4"),
+    ("f", "u1"),         # 1 = fishing hotspot message, 0 = vessel location
+])
+COORD_SCALE = 1e5
+
+# Parsed messages, one row per message that passed validation
+FRAME_DTYPE = np.dtype([
+    ("index", "<u4"),    # position of the message in the payload
+    ("vesselId", object),
+    ("messageId", object),
+    ("lat", "<f8"),
+    ("lng", "<f8"),
+    ("f", "u1"),
+])
+
+INVALID_FORMAT = "Invalid format for 'id', 'l' or 'f'"
+OUT_OF_RANGE = "Latitude/longitude out of range"
+
+
+def _validate(frame, bad_format):
+    """
+    Vectorized checks over the whole frame. Returns the valid rows and a
+    {index: error} dict for the rest.
+    """
+    lat, lng = frame["lat"], frame["lng"]
+    in_range = np.isfinite(lat) & np.isfinite(lng) & (np.abs(lat) <= 90) & (np.abs(lng) <= 180)
+    bad_format = bad_format | (frame["f"] > 1)
+    valid = ~bad_format & in_range
+
+    errors = {int(i): INVALID_FORMAT for i in frame["index"][bad_format]}
+    errors.update({int(i): OUT_OF_RANGE for i in frame["index"][~bad_format & ~in_range]})
+
+    frame = frame[valid]
+    frame["lat"] = np.round(frame["lat"], 5)
+    frame["lng"] = np.round(frame["lng"], 5)
+    return frame, errors
+
+
+def parse_text_frame(payload):
+    """
+    Parse newline-delimited `vesselId|messageId,lat|lng,f` messages.
+
+    Returns (frame, errors, total): a FRAME_DTYPE array of the valid messages,
+    {index: error} for the invalid ones and the number of messages. Blank
+    lines are skipped and do not count as messages.
+    """
+    lines = [line for line in payload.decode("utf-8", errors="replace").splitlines() if line.strip()]
+    total = len(lines)
+
+    vessel_ids, message_ids, lats, lngs, flags = [], [], [], [], []
+    split_error = np.zeros(total, dtype=bool)
+    for position, line in enumerate(lines):
+        fields = line.strip().split(",")
+        id_part = fields[0].split("|")
+        l_part = fields[1].split("|") if len(fields) == 3 else ()
+        if len(id_part) != 2 or len(l_part) != 2:
+            split_error[position] = True
+            vessel_ids.append(None)
+            message_ids.append(None)
+            lats.append("nan")
+            lngs.append("nan")
+            flags.append("0")
+            continue
+        vessel_ids.append(id_part[0])
+        message_ids.append(id_part[1])
+        lats.append(l_part[0])
+        lngs.append(l_part[1])
+        flags.append(fields[2])
+
+    frame = np.empty(total, dtype=FRAME_DTYPE)
+    frame["index"] = np.arange(total)
+    frame["vesselId"] = vessel_ids
+    frame["messageId"] = message_ids
+    frame["lat"], lat_error = to_float_array(lats)
+    frame["lng"], lng_error = to_float_array(lngs)
+    f, f_error = to_float_array(flags)
+    f_error |= ~np.isin(f, (0, 1))
+    frame["f"] = np.where(f_error, 0, f)
+
+    frame, errors = _validate(frame, split_error | lat_error | lng_error | f_error)
+    return frame, errors, total
+
+
+def parse_binary_frame(payload):
+    """
+    Parse a packed frame of WIRE_DTYPE records. Returns (frame, errors, total)
+    like parse_text_frame; raises ValueError for a truncated frame.
+    """
+    if len(payload) % WIRE_DTYPE.itemsize:
+        raise ValueError(f"Frame size must be a multiple of {WIRE_DTYPE.itemsize} bytes")
+    records = np.frombuffer(payload, dtype=WIRE_DTYPE)
+    total = len(records)
+
+    frame = np.empty(total, dtype=FRAME_DTYPE)
+    frame["index"] = np.arange(total)
+    frame["vesselId"] = records["vessel"].astype(str).astype(object)
+    frame["messageId"] = np.char.zfill(records["message"].astype(str), 4).astype(object)
+    frame["lat"] = records["lat"] / COORD_SCALE
+    frame["lng"] = records["lng"] / COORD_SCALE
+    frame["f"] = records["f"]
+
+    frame, errors = _validate(frame, np.zeros(total, dtype=bool))
+    return frame, errors, total
@@ -1,11 +1,27 @@
+import os
+import time
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .apis import hotspots, vessels, suggestions
+from .apis import hotspots, vessels, suggestions, lora, metrics as metrics_api
+from .database import ensure_indexes
+from .utils import seed_hotspot_counter
+from .timeseries import ensure_vessel_locations_storage
+from .occupancy import ensure_occupancy_counters
+from .migrations import backfill_last_used, convert_hotspot_dates, backfill_geohash
 from .scheduler import scheduler
+from .leader import job_leases
+from .spatial import active_hotspot_index
+from .ingest import WRITE_BEHIND_ENABLED, vessel_write_buffer
+from .dwell import DWELL_DETECTION, warm_dwell_detector, stop_following
+from .metrics import http_requests, http_latency, route_template
+from .profiler import profiler
 
 app = FastAPI()
 
+# Set to false in API workers when the jobs run in a separate `python -m app.worker` process
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+
 # Enable CORS for all origins (Allow all requests)
 app.add_middleware(
     CORSMiddleware,
@@ -15,21 +31,73 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Per-route request counts and latency for /metrics, and the profiler hook
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    # Routes have no path parameters, so the raw path names the profiled route
+    profiling = profiler.enter(request.url.path)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        if profiling:
+            profiler.leave()
+        route = route_template(request)
+        http_requests.inc(request.method, route, str(status))
+        http_latency.observe(request.method, route, value=time.perf_counter() - started)
+
 # Include routers
 app.include_router(hotspots.router, tags=["Hotspots"])
 app.include_router(vessels.router, tags=["Vessels"])
 app.include_router(suggestions.router, tags=["Suggestions"])
+app.include_router(lora.router, tags=["LoRa"])
+app.include_router(metrics_api.router, tags=["Metrics"])
+
+@app.on_event("startup")
+def prepare_database():
+    ensure_vessel_locations_storage()
+    ensure_indexes()
+    seed_hotspot_counter()
+    ensure_occupancy_counters()
+    convert_hotspot_dates()
+    backfill_last_used()
+    backfill_geohash()
+
+@app.on_event("startup")
+def build_hotspot_index():
+    active_hotspot_index.rebuild()
+
+@app.on_event("startup")
+def warm_inline_dwell_detection():
+    if DWELL_DETECTION == "inline":
+        warm_dwell_detector()
 
 @app.on_event("startup")
 def start_scheduler():
+    if not SCHEDULER_ENABLED:               # jobs run in `python -m app.worker` instead
+        print("[Scheduler] disabled in this process (SCHEDULER_ENABLED=false)")
+        return
     if not scheduler.running:               # avoid double-start in reload mode
         scheduler.start()
         print("[Scheduler] started")
 
+@app.on_event("startup")
+async def start_write_behind():
+    if WRITE_BEHIND_ENABLED:
+        vessel_write_buffer.start()
+
 @app.on_event("shutdown")
-def stop_scheduler():
-    scheduler.shutdown()
-    print("[Scheduler] stopped")
+async def stop_scheduler():
+    if scheduler.running:
+        scheduler.shutdown()
+        stop_following()
+        job_leases.release_all()
+        print("[Scheduler] stopped")
+    # Flush vessel locations still waiting in the write-behind queue
+    await vessel_write_buffer.drain()
 
 
 # Custom exception handler for 404 errors
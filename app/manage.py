@@ -0,0 +1,81 @@
+"""
+One-shot maintenance commands.
+
+Usage:
+    python -m app.manage ensure-indexes
+    python -m app.manage backfill-geo
+    python -m app.manage seed-counters
+    python -m app.manage rebuild-latest
+    python -m app.manage backfill-ts
+    python -m app.manage migrate-timeseries
+    python -m app.manage rollup
+    python -m app.manage recount-occupancy
+    python -m app.manage backfill-last-used
+    python -m app.manage migrate-hotspot-dates
+    python -m app.manage compact-hotspots
+    python -m app.manage rebuild-tiles
+"""
+import argparse
+from .database import ensure_indexes
+from .utils import seed_hotspot_counter
+from .vessel_latest import rebuild_vessel_latest
+from .occupancy import recount_occupancy
+from .clustering import compact_hotspots
+from .tiles import rebuild_suggestion_tiles
+from . import migrations, timeseries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("ensure-indexes", help="Create the MongoDB indexes")
+    commands.add_parser("backfill-geo", help="Add GeoJSON points to existing hotspots")
+    commands.add_parser("seed-counters", help="Seed the hotspotId counter from the current max")
+    commands.add_parser("rebuild-latest", help="Rebuild vessel_latest from the location history")
+    commands.add_parser("backfill-ts", help="Add the BSON ts date to existing vessel locations")
+    commands.add_parser("migrate-timeseries", help="Convert vessels_locations into a time-series collection")
+    commands.add_parser("rollup", help="Downsample vessel locations older than ROLLUP_AFTER_DAYS now")
+    commands.add_parser("recount-occupancy", help="Recompute every hotspot's vesselCount from active links")
+    commands.add_parser("backfill-last-used", help="Add lastUsedDateTime to existing hotspots")
+    commands.add_parser("migrate-hotspot-dates", help="Store hotspot currentDateTime as a BSON date and add geohash cells")
+    commands.add_parser("compact-hotspots", help="Merge active hotspots within HOTSPOT_CLUSTER_RADIUS_METERS of a bigger one")
+    commands.add_parser("rebuild-tiles", help="Recompute every precomputed suggestion tile")
+    args = parser.parse_args(argv)
+
+    if args.command == "ensure-indexes":
+        timeseries.ensure_vessel_locations_storage()
+        ensure_indexes()
+    elif args.command == "backfill-geo":
+        ensure_indexes()
+        migrations.backfill_geo_points()
+    elif args.command == "seed-counters":
+        print(f"[Manage] hotspotId counter seeded from max id {seed_hotspot_counter()}")
+    elif args.command == "rebuild-latest":
+        ensure_indexes()
+        rebuild_vessel_latest()
+    elif args.command == "backfill-ts":
+        timeseries.backfill_ts()
+    elif args.command == "migrate-timeseries":
+        timeseries.migrate_to_timeseries()
+        timeseries.ensure_vessel_locations_storage()
+        ensure_indexes()
+    elif args.command == "rollup":
+        timeseries.rollup_vessel_locations()
+    elif args.command == "recount-occupancy":
+        recount_occupancy()
+    elif args.command == "backfill-last-used":
+        ensure_indexes()
+        migrations.backfill_last_used()
+    elif args.command == "migrate-hotspot-dates":
+        ensure_indexes()
+        migrations.convert_hotspot_dates()
+        migrations.backfill_geohash()
+    elif args.command == "compact-hotspots":
+        compact_hotspots()
+    elif args.command == "rebuild-tiles":
+        ensure_indexes()
+        rebuild_suggestion_tiles()
+
+
+if __name__ == "__main__":
+    main()
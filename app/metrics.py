@@ -0,0 +1,207 @@
+import bisect
+import functools
+import threading
+import time
+from apscheduler import events
+from pymongo import monitoring
+
+# Minimal Prometheus text-format registry: counters, gauges and histograms
+# with labels, safe to update from the event loop, the DB thread pool and
+# the scheduler threads. Exposed by GET /metrics (app/apis/metrics.py).
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _format_labels(self, values, extra=None):
+        pairs = list(zip(self.labels, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, value in items:
+            lines.extend(self._render_sample(values, value))
+        return lines
+
+    def _render_sample(self, values, value):
+        return [f"{self.name}{self._format_labels(values)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        with self._lock:
+            sample = self._values.get(labels)
+            if sample is None:
+                sample = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            sample[0][bisect.bisect_left(self.buckets, value)] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    def _render_sample(self, values, value):
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{self.name}_bucket{self._format_labels(values, ('le', le))} {cumulative}")
+        lines.append(f"{self.name}_sum{self._format_labels(values)} {total}")
+        lines.append(f"{self.name}_count{self._format_labels(values)} {count}")
+        return lines
+
+
+REGISTRY = []
+COLLECTORS = []  # Callables run before every scrape, to refresh gauges
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    for collect in COLLECTORS:
+        try:
+            collect()
+        except Exception as e:
+            print(f"[Metrics] collector {collect.__name__} failed: {e}")
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------------------
+# HTTP -------------------------------------------------------
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+
+
+def route_template(request):
+    """Path template of the matched route (bounded label values), or 'unmatched'."""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+# ------------------------------------------------------------
+# MongoDB ----------------------------------------------------
+
+mongo_operations = Counter("mongo_operations_total", "MongoDB commands by collection, command and outcome.",
+                           ("collection", "command", "outcome"))
+mongo_latency = Histogram("mongo_operation_duration_seconds", "MongoDB command latency.", ("collection", "command"))
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Count and time every command the driver sends, by collection and command."""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else ""
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event, outcome):
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), "")
+        mongo_operations.inc(collection, event.command_name, outcome)
+        mongo_latency.observe(collection, event.command_name, value=event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+mongo_command_listener = MongoCommandListener()
+
+
+# ------------------------------------------------------------
+# Scheduler jobs ---------------------------------------------
+
+job_runs = Counter("scheduler_job_runs_total", "Scheduler job runs by outcome.", ("job", "outcome"))
+job_duration = Histogram("scheduler_job_duration_seconds", "Scheduler job run time.", ("job",), JOB_BUCKETS)
+job_items = Counter("scheduler_job_items_processed_total", "Items (links, hotspots, buckets) changed by scheduler jobs.", ("job",))
+job_last_success = Gauge("scheduler_job_last_success_timestamp_seconds", "Unix time of the last successful run.", ("job",))
+job_missed = Counter("scheduler_job_missed_total", "Runs skipped because they were too late (misfire).", ("job",))
+job_overlaps = Counter("scheduler_job_overlaps_total", "Runs skipped because the previous run was still going.", ("job",))
+
+
+
+def instrument_job(func):
+    """
+    Record duration, outcome, last success and items processed of a
+    scheduler job. Jobs return a count or the list of ids they changed.
+    """
+    job = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            job_runs.inc(job, "error")
+            raise
+        finally:
+            job_duration.observe(job, value=time.perf_counter() - started)
+        job_runs.inc(job, "success")
+        job_last_success.set(job, value=time.time())
+        if isinstance(result, int) and not isinstance(result, bool):
+            job_items.inc(job, amount=result)
+        elif isinstance(result, (list, tuple, set)):
+            job_items.inc(job, amount=len(result))
+        return result
+
+    return wrapper
+
+
+def record_job_event(event):
+    """APScheduler listener for the runs a job never got to make."""
+    if event.code == events.EVENT_JOB_MISSED:
+        job_missed.inc(event.job_id)
+    elif event.code == events.EVENT_JOB_MAX_INSTANCES:
+        job_overlaps.inc(event.job_id)
+
+
+JOB_EVENT_MASK = events.EVENT_JOB_MISSED | events.EVENT_JOB_MAX_INSTANCES
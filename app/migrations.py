@@ -0,0 +1,93 @@
+from datetime import datetime
+from pymongo import UpdateOne
+from .database import fishing_locations, hotspots_vessels
+from .spatial import geohash_encode, HOTSPOT_GEOHASH_PRECISION
+
+
+def backfill_geo_points():
+    """
+    Add the GeoJSON `location` point to hotspots saved before the 2dsphere
+    mode existed. Runs as a single server-side update.
+    """
+    result = fishing_locations.update_many(
+        {"location": {"$exists": False}, "latitude": {"$ne": None}, "longitude": {"$ne": None}},
+        [{"$set": {"location": {
+            "type": "Point",
+            "coordinates": [{"$toDouble": "$longitude"}, {"$toDouble": "$latitude"}],
+        }}}],
+    )
+    print(f"[Migrations] backfill_geo_points – {result.modified_count} hotspot(s) updated.")
+    return result.modified_count
+
+
+def backfill_last_used():
+    """
+    Add the BSON `lastUsedDateTime` date to hotspots saved before it existed:
+    the time of their latest vessel link, else their creation time.
+    """
+    if not fishing_locations.find_one({"lastUsedDateTime": {"$exists": False}}, {"_id": 1}):
+        return 0
+
+    operations = []
+    for row in hotspots_vessels.aggregate([
+        {"$group": {"_id": "$hotspotId", "lastLinked": {"$max": "$dateTime"}}},
+    ]):
+        try:
+            last_linked = datetime.fromisoformat(row["lastLinked"])
+        except (TypeError, ValueError):
+            continue
+        operations.append(UpdateOne(
+            {"hotspotId": row["_id"], "lastUsedDateTime": {"$exists": False}},
+            {"$set": {"lastUsedDateTime": last_linked}},
+        ))
+    linked = fishing_locations.bulk_write(operations, ordered=False).modified_count if operations else 0
+
+    # Never linked: fall back to currentDateTime (date or ISO string), or now if unparsable
+    created = fishing_locations.update_many(
+        {"lastUsedDateTime": {"$exists": False}},
+        [{"$set": {"lastUsedDateTime": {"$cond": [
+            {"$eq": [{"$type": "$currentDateTime"}, "date"]},
+            "$currentDateTime",
+            {"$dateFromString": {"dateString": "$currentDateTime", "onError": "$$NOW", "onNull": "$$NOW"}},
+        ]}}}],
+    ).modified_count
+    print(f"[Migrations] backfill_last_used – {linked + created} hotspot(s) updated.")
+    return linked + created
+
+
+def convert_hotspot_dates():
+    """
+    Store `currentDateTime` of hotspots saved before it was a BSON date as a
+    date (it was a local-time ISO string). Runs as a single server-side update.
+    """
+    if not fishing_locations.find_one({"currentDateTime": {"$type": "string"}}, {"_id": 1}):
+        return 0
+    result = fishing_locations.update_many(
+        {"currentDateTime": {"$type": "string"}},
+        [{"$set": {"currentDateTime": {"$dateFromString": {
+            "dateString": "$currentDateTime", "onError": "$currentDateTime",
+        }}}}],
+    )
+    print(f"[Migrations] convert_hotspot_dates – {result.modified_count} hotspot(s) updated.")
+    return result.modified_count
+
+
+def backfill_geohash(batch_size=1000):
+    """Add the `geohash` cell used by get_fishing_locations?aggregate=grid to existing hotspots."""
+    updated = 0
+    operations = []
+    cursor = fishing_locations.find(
+        {"geohash": {"$exists": False}, "latitude": {"$ne": None}, "longitude": {"$ne": None}},
+        {"latitude": 1, "longitude": 1},
+    )
+    for doc in cursor:
+        geohash = geohash_encode(float(doc["latitude"]), float(doc["longitude"]), HOTSPOT_GEOHASH_PRECISION)
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"geohash": geohash}}))
+        if len(operations) >= batch_size:
+            updated += fishing_locations.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += fishing_locations.bulk_write(operations, ordered=False).modified_count
+    if updated:
+        print(f"[Migrations] backfill_geohash – {updated} hotspot(s) updated.")
+    return updated
@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel
 
 class FishingLocationRequest(BaseModel):
@@ -14,4 +15,8 @@ class UnlinkVesselHotspotRequest(BaseModel):
 
 class VesselLocationRequest(BaseModel):
     id: str  # Vessel ID and Message ID separated by "|"
-    l: str   # Latitude and Longitude separated by "|"
\ No newline at end of file
+    l: str   # Latitude and Longitude separated by "|"
+
+class VesselLocationBatchRequest(BaseModel):
+    id: List[str]  # Raw "vesselId|messageId" strings
+    l: List[str]   # Raw "lat|lng" strings, same order as `id`
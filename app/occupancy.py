@@ -0,0 +1,64 @@
+from collections import Counter
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateMany, UpdateOne
+from .database import fishing_locations, hotspots_vessels
+
+# Occupancy is the `vesselCount` field of each hotspot document: the number
+# of active (status = 1) vessel links. It is only changed with atomic $inc
+# updates, so every worker sees the same value and reading it is O(1).
+
+
+def reserve_slot(hotspot_id, max_vessels):
+    """
+    Atomically take one slot of a hotspot and mark it as used now. Returns
+    the updated hotspot, or None when it does not exist or is already full.
+    """
+    return fishing_locations.find_one_and_update(
+        {"hotspotId": hotspot_id, "$or": [
+            {"vesselCount": {"$lt": max_vessels}},
+            {"vesselCount": {"$exists": False}},
+        ]},
+        {"$inc": {"vesselCount": 1}, "$set": {"lastUsedDateTime": datetime.utcnow()}},
+        projection={"_id": 0, "hotspotId": 1, "vesselCount": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def release_slots(released):
+    """Give slots back: `released` maps hotspotId -> number of links deactivated."""
+    operations = [
+        UpdateOne(
+            {"hotspotId": hotspot_id},
+            # Never drop below zero, even if counts drifted
+            [{"$set": {"vesselCount": {"$max": [
+                0, {"$subtract": [{"$ifNull": ["$vesselCount", 0]}, count]},
+            ]}}}],
+        )
+        for hotspot_id, count in Counter(released).items() if count
+    ]
+    if operations:
+        fishing_locations.bulk_write(operations, ordered=False)
+
+
+def recount_occupancy():
+    """Recompute every hotspot's vesselCount from its active links."""
+    counts = {
+        row["_id"]: row["count"]
+        for row in hotspots_vessels.aggregate([
+            {"$match": {"status": 1}},
+            {"$group": {"_id": "$hotspotId", "count": {"$sum": 1}}},
+        ])
+    }
+    operations = [UpdateOne({"hotspotId": hotspot_id}, {"$set": {"vesselCount": count}})
+                  for hotspot_id, count in counts.items()]
+    operations.append(UpdateMany(
+        {"hotspotId": {"$nin": list(counts)}}, {"$set": {"vesselCount": 0}}
+    ))
+    fishing_locations.bulk_write(operations, ordered=False)
+    print(f"[Occupancy] recounted – {sum(counts.values())} active link(s) on {len(counts)} hotspot(s)")
+
+
+def ensure_occupancy_counters():
+    """Recount once if hotspots saved before the counter existed are present."""
+    if fishing_locations.find_one({"vesselCount": {"$exists": False}}, {"_id": 1}):
+        recount_occupancy()
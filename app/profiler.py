@@ -0,0 +1,96 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Leaf functions of threads that are idle rather than doing work
+IDLE_FUNCTIONS = {"select", "poll", "wait", "_wait_for_tstate_lock", "get", "accept", "_worker", "sleep"}
+
+
+class SamplingProfiler:
+    """
+    Low-overhead statistical profiler that can be switched on at runtime for
+    one route. While a request to that route is in flight, a background
+    thread samples the Python stack of every busy thread (event loop and DB
+    thread pool) every `interval_ms` and counts identical stacks. The result
+    is in collapsed-stack format, ready for flamegraph.pl or speedscope.
+    """
+
+    def __init__(self):
+        self.route = None
+        self.interval = 0.005
+        self.deadline = 0.0
+        self.samples = Counter()
+        self.sample_count = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def active(self):
+        return self.route is not None and time.monotonic() < self.deadline
+
+    def start(self, route, seconds=30, interval_ms=5):
+        """(Re)start sampling `route` for `seconds`; previous samples are dropped."""
+        with self._lock:
+            self.route = route
+            self.interval = max(interval_ms, 1) / 1000
+            self.deadline = time.monotonic() + seconds
+            self.samples = Counter()
+            self.sample_count = 0
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        print(f"[Profiler] sampling {route} every {interval_ms} ms for {seconds} s")
+
+    def stop(self):
+        with self._lock:
+            self.deadline = 0.0
+
+    def enter(self, route):
+        """Called by the metrics middleware around every request."""
+        if route == self.route and self.active:
+            with self._lock:
+                self._in_flight += 1
+            return True
+        return False
+
+    def leave(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while self.active:
+            if self._in_flight > 0:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id or frame.f_code.co_name in IDLE_FUNCTIONS:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                        frame = frame.f_back
+                    with self._lock:
+                        self.samples[";".join(reversed(stack))] += 1
+                        self.sample_count += 1
+            time.sleep(self.interval)
+        print(f"[Profiler] stopped – {self.sample_count} sample(s) of {self.route}")
+
+    def snapshot(self, top=50):
+        with self._lock:
+            return {
+                "route": self.route,
+                "active": self.active,
+                "intervalMs": self.interval * 1000,
+                "samples": self.sample_count,
+                "stacks": [{"stack": stack, "count": count} for stack, count in self.samples.most_common(top)],
+            }
+
+    def collapsed(self):
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,420 @@
+"""
+Replay historical vessel tracks through the fishing detection jobs in
+simulated time, and write the hotspots they would have produced to a
+separate collection (to tune thresholds, or rebuild hotspots after a fix).
+
+Usage:
+    python -m app.replay --from 2025-01-01 --to 2025-04-01 --target replay_hotspots
+    python -m app.replay --input tracks.ndjson --target replay_hotspots --drop --workers 8
+    python -m app.replay --input tracks.parquet --target replay_hotspots --detector dwell --dwell-minutes 45
+
+Points come from vessels_locations (dateTime range) or from an export with
+one {vesselId, ts or dateTime, lat, lng} record per line (NDJSON, e.g.
+mongoexport) or per row (Parquet, needs pyarrow). Each vessel's track is
+analysed on its own in a process pool:
+    • scan: scan_fishing_activity run every simulated minute (first/last
+      position of the last hour within MAX_DISTANCE_THRESHOLD metres)
+    • dwell: the streaming dwell detector of app/dwell.py
+    • activity sessions as check_vessel_activity sees them (a silence of
+      more than 15 minutes ends one)
+The candidates are then merged in time order and deduplicated against the
+simulated active hotspots (LOCATION_RADIUS_METERS), which are deactivated
+UNUSED_HOTSPOT_DAYS after their last use, checked every
+UNUSED_HOTSPOT_CHECK_MINUTES.
+"""
+import argparse
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+import numpy as np
+from .database import APP_COLLECTIONS, db, vessels_locations
+from .dwell import DwellDetector, DWELL_RADIUS_METERS, DWELL_MINUTES, DWELL_MAX_GAP_MINUTES, DWELL_BUFFER_SIZE
+from .spatial import GridIndex, METERS_PER_DEGREE, LOCATION_RADIUS_METERS, HOTSPOT_GEOHASH_PRECISION, geohash_encode
+from .utils import geo_point, haversine_np
+
+SCAN_WINDOW_SECONDS = 3600      # scan_fishing_activity looks at the last 60 minutes
+SCAN_TICK_SECONDS = 60          # ... every minute
+INACTIVE_AFTER_SECONDS = 900    # check_vessel_activity: 15 minutes without a report
+READ_BATCH = 100000
+VESSELS_PER_TASK = 50
+INSERT_BATCH = 10000
+
+
+def _epoch(value):
+    """Seconds since the epoch of a stored time; naive values are taken as UTC like BSON dates."""
+    if isinstance(value, dict):
+        value = value["$date"]  # mongoexport extended JSON
+        if isinstance(value, dict):
+            return int(value["$numberLong"]) / 1000  # canonical mode: milliseconds
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _as_date(seconds):
+    # Back to the naive form the app stores
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+
+# ------------------------------------------------------------
+# Reading and partitioning ------------------------------------
+
+def input_chunks(path, count):
+    """Independent pieces of an export: byte ranges of an NDJSON file, row groups of a Parquet file."""
+    if path.endswith(".parquet"):
+        return [("parquet", path, group) for group in range(_parquet_file(path).num_row_groups)]
+    size = os.path.getsize(path)
+    bounds = [size * index // count for index in range(count + 1)]
+    return [("ndjson", path, (begin, end)) for begin, end in zip(bounds, bounds[1:]) if end > begin]
+
+
+def _read_ndjson(path, byte_range):
+    """Lines starting inside the byte range (a line crossing its end belongs to it)."""
+    import json
+    begin, end = byte_range
+    with open(path, "rb") as f:
+        if begin:
+            f.seek(begin - 1)
+            f.readline()  # Rest of the line the previous range ends with
+        position = f.tell()
+        batch = []
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            if line.strip():
+                batch.append(json.loads(line))
+                if len(batch) == READ_BATCH:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+
+def _parquet_file(path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Reading Parquet needs pyarrow: pip install pyarrow")
+    return pq.ParquetFile(path)
+
+
+def _read_parquet(path, group):
+    parquet = _parquet_file(path)
+    columns = [name for name in ("vesselId", "ts", "dateTime", "lat", "lng") if name in parquet.schema_arrow.names]
+    yield parquet.read_row_group(group, columns=columns).to_pylist()
+
+
+def _columns(records):
+    vessel_ids = np.array([str(record["vesselId"]) for record in records])
+    times = np.array([_epoch(record.get("ts") or record["dateTime"]) for record in records], dtype=np.float64)
+    lats = np.array([float(record["lat"]) for record in records], dtype=np.float64)
+    lngs = np.array([float(record["lng"]) for record in records], dtype=np.float64)
+    return vessel_ids, times, lats, lngs
+
+
+def spill_chunk(chunk, chunk_index, settings):
+    """
+    Read one chunk of an export and append its points, split by a stable
+    hash of the vesselId, to `part-<partition>-<chunk>.pkl` files in the
+    spill directory. Returns the number of points kept.
+    """
+    kind, path, piece = chunk
+    reader = _read_parquet if kind == "parquet" else _read_ndjson
+    partitions, files, total = settings["partitions"], {}, 0
+    try:
+        for records in reader(path, piece):
+            vessel_ids, times, lats, lngs = _columns(records)
+            keep = (times >= settings["start"]) & (times < settings["end"])
+            vessel_ids, times, lats, lngs = vessel_ids[keep], times[keep], lats[keep], lngs[keep]
+            total += len(times)
+            buckets = np.array([zlib.crc32(vessel_id.encode()) % partitions for vessel_id in vessel_ids], dtype=int)
+            for index in np.unique(buckets).tolist():
+                if index not in files:
+                    files[index] = open(os.path.join(settings["spill_dir"], f"part-{index}-{chunk_index}.pkl"), "wb")
+                rows = buckets == index
+                pickle.dump((vessel_ids[rows], times[rows], lats[rows], lngs[rows]), files[index])
+    finally:
+        for f in files.values():
+            f.close()
+    return total
+
+
+def _load_spill(paths):
+    chunks = []
+    for path in paths:
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    chunks.append(pickle.load(f))
+                except EOFError:
+                    break
+    if not chunks:
+        return None
+    return tuple(np.concatenate(column) for column in zip(*chunks))
+
+
+def _date_range_query(start, end):
+    """dateTime bounds of the replayed period (dateTime is indexed with vesselId)."""
+    bounds = {}
+    if start > float("-inf"):
+        bounds["$gte"] = _as_date(start).isoformat()
+    if end < float("inf"):
+        bounds["$lt"] = _as_date(end).isoformat()
+    return {"dateTime": bounds} if bounds else {}
+
+
+def _load_mongo(vessel_ids, start, end):
+    cursor = vessels_locations.find(
+        {"vesselId": {"$in": vessel_ids}, **_date_range_query(start, end)},
+        {"_id": 0, "vesselId": 1, "dateTime": 1, "ts": 1, "lat": 1, "lng": 1},
+        batch_size=READ_BATCH,
+    )
+    # Converted READ_BATCH documents at a time: only the compact columns of
+    # the partition are held, never all of its documents at once
+    chunks, records = [], []
+    for record in cursor:
+        records.append(record)
+        if len(records) == READ_BATCH:
+            chunks.append(_columns(records))
+            records = []
+    if records:
+        chunks.append(_columns(records))
+    if not chunks:
+        return None
+    return tuple(np.concatenate(column) for column in zip(*chunks))
+
+
+# ------------------------------------------------------------
+# Per-vessel analysis (runs in the pool) -----------------------
+
+def scan_candidates(times, lats, lngs, max_distance_m):
+    """
+    scan_fishing_activity at every minute of a vessel's (time-sorted) track,
+    vectorized. Ticks whose newest point is the same give the same candidate,
+    so only the first of them is kept. Returns (tick times, point indexes).
+    """
+    first_tick = np.ceil(times[0] / SCAN_TICK_SECONDS) * SCAN_TICK_SECONDS
+    ticks = np.arange(first_tick, times[-1] + SCAN_WINDOW_SECONDS, SCAN_TICK_SECONDS)
+    last = np.searchsorted(times, ticks, side="right") - 1
+    first = np.searchsorted(times, ticks - SCAN_WINDOW_SECONDS, side="left")
+    enough = last - first >= 1
+    ticks, first, last = ticks[enough], first[enough], last[enough]
+    stationary = haversine_np(lats[first], lngs[first], lats[last], lngs[last]) <= max_distance_m
+    ticks, last = ticks[stationary], last[stationary]
+    _, unique = np.unique(last, return_index=True)
+    return ticks[unique], last[unique]
+
+
+def analyse_partition(task, settings):
+    """Candidates (time, vesselId, lat, lng) and activity stats of one partition of vessels."""
+    kind, payload = task
+    columns = _load_spill(payload) if kind == "spill" else _load_mongo(payload, settings["start"], settings["end"])
+    result = {"times": [], "vessels": [], "lats": [], "lngs": [], "points": 0, "tracks": 0, "sessions": 0,
+              "last": float("-inf")}
+    if columns is None:
+        return result
+    vessel_ids, times, lats, lngs = columns
+    order = np.lexsort((times, vessel_ids))
+    vessel_ids, times, lats, lngs = vessel_ids[order], times[order], lats[order], lngs[order]
+    boundaries = np.flatnonzero(vessel_ids[1:] != vessel_ids[:-1]) + 1
+    detector = None
+    if settings["detector"] == "dwell":
+        detector = DwellDetector(settings["dwell_radius_m"], settings["dwell_minutes"] * 60,
+                                 DWELL_MAX_GAP_MINUTES * 60, DWELL_BUFFER_SIZE)
+
+    for begin, stop in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(times)]))):
+        vessel_id = str(vessel_ids[begin])
+        t, lat, lng = times[begin:stop], lats[begin:stop], lngs[begin:stop]
+        result["points"] += len(t)
+        result["last"] = max(result["last"], float(t[-1]))
+        result["tracks"] += 1
+        result["sessions"] += 1 + int(np.count_nonzero(np.diff(t) > INACTIVE_AFTER_SECONDS))
+
+        if detector is None:
+            ticks, index = scan_candidates(t, lat, lng, settings["max_distance_m"])
+            result["times"].append(ticks)
+            result["lats"].append(lat[index])
+            result["lngs"].append(lng[index])
+            result["vessels"] += [vessel_id] * len(ticks)
+            continue
+        # Whole track in one call: the detector then forgets the vessels done before
+        for event in detector.feed([(vessel_id, *point) for point in zip(t.tolist(), lat.tolist(), lng.tolist())]):
+            result["times"].append([event["time"]])
+            result["lats"].append([event["latitude"]])
+            result["lngs"].append([event["longitude"]])
+            result["vessels"].append(vessel_id)
+
+    for key in ("times", "lats", "lngs"):
+        result[key] = np.concatenate(result[key]) if result[key] else np.empty(0)
+    return result
+
+
+# ------------------------------------------------------------
+# Time-ordered merge: dedup and deactivation ---------------------
+
+def simulate_hotspots(candidates, radius_m, unused_days, check_minutes, until, touch_on_revisit=False):
+    """
+    Apply create_hotspots' radius dedup and deactivate_unused_hotspots to
+    the time-sorted candidates, with the checks running up to `until`.
+    Returns the hotspot documents.
+    """
+    times, vessels, lats, lngs = candidates
+    active = GridIndex(cell_deg=max(radius_m, 1.0) / METERS_PER_DEGREE)
+    hotspots = []
+    by_last_use = []  # heap of (last use, position); entries go stale when a hotspot is used again
+    unused_seconds = unused_days * 86400
+    check_seconds = check_minutes * 60
+    next_check = (np.floor(times[0] / check_seconds) + 1) * check_seconds if len(times) else float("inf")
+
+    def deactivate(now):
+        cutoff = now - unused_seconds
+        while by_last_use and by_last_use[0][0] < cutoff:
+            last_used, position = heapq.heappop(by_last_use)
+            if hotspots[position]["_lastUsed"] == last_used:
+                active.remove(position)
+                hotspots[position]["status"] = "inactive"
+                hotspots[position]["inactivatedDateTime"] = _as_date(now).isoformat()
+
+    for t, vessel_id, lat, lng in zip(times.tolist(), vessels, lats.tolist(), lngs.tolist()):
+        while next_check <= t:
+            deactivate(next_check)
+            next_check += check_seconds
+        hits = active.query_radius(lat, lng, radius_m)
+        if hits:
+            if touch_on_revisit:
+                for position, _ in hits:
+                    hotspots[position]["_lastUsed"] = t
+                    heapq.heappush(by_last_use, (t, position))
+            continue
+        lat, lng = round(lat, 5), round(lng, 5)
+        active.add(len(hotspots), lat, lng)
+        heapq.heappush(by_last_use, (t, len(hotspots)))
+        hotspots.append({
+            "hotspotId": len(hotspots) + 1,
+            "vesselId": vessel_id,
+            "messageId": None,
+            "latitude": lat,
+            "longitude": lng,
+            "location": geo_point(lat, lng),
+            "geohash": geohash_encode(lat, lng, HOTSPOT_GEOHASH_PRECISION),
+            "currentDateTime": _as_date(t),
+            "status": "active",
+            "f": 1,
+            "vesselCount": 0,
+            "_lastUsed": t,
+        })
+    while next_check <= until:
+        deactivate(next_check)
+        next_check += check_seconds
+    for hotspot in hotspots:
+        hotspot["lastUsedDateTime"] = _as_date(hotspot.pop("_lastUsed"))
+    return hotspots
+
+
+def _day(value):
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.replay", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="NDJSON or .parquet export (default: read vessels_locations)")
+    parser.add_argument("--from", dest="start", help="First day replayed, YYYY-MM-DD (default: everything)")
+    parser.add_argument("--to", dest="end", help="Day after the last one replayed, YYYY-MM-DD")
+    parser.add_argument("--target", required=True, help="Collection the replayed hotspots are written to")
+    parser.add_argument("--drop", action="store_true", help="Empty the target collection first")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--partitions", type=int, help="Vessel partitions of a file input (default: 8 per worker)")
+    parser.add_argument("--detector", choices=("scan", "dwell"), default="scan")
+    parser.add_argument("--max-distance-m", type=float, default=float(os.getenv("MAX_DISTANCE_THRESHOLD", "1000")),
+                        help="scan: largest first-to-last distance in an hour of a fishing vessel")
+    parser.add_argument("--dwell-radius-m", type=float, default=DWELL_RADIUS_METERS)
+    parser.add_argument("--dwell-minutes", type=float, default=DWELL_MINUTES)
+    parser.add_argument("--hotspot-radius-m", type=float, default=LOCATION_RADIUS_METERS)
+    parser.add_argument("--unused-days", type=float, default=float(os.getenv("UNUSED_HOTSPOT_DAYS", "3")))
+    parser.add_argument("--check-minutes", type=float, default=float(os.getenv("UNUSED_HOTSPOT_CHECK_MINUTES", "60")))
+    parser.add_argument("--touch-on-revisit", action="store_true",
+                        help="Count a fishing vessel at an active hotspot as a use (links are not in the tracks)")
+    args = parser.parse_args(argv)
+
+    if args.target in APP_COLLECTIONS or args.target.startswith("system."):
+        raise SystemExit(f"Refusing to write into the live {args.target} collection")
+    target = db[args.target]
+    if args.drop:
+        target.drop()
+    elif target.estimated_document_count():
+        raise SystemExit(f"{args.target} is not empty; pass --drop to replace it")
+
+    started = time.perf_counter()
+    settings = {
+        "start": _day(args.start) if args.start else float("-inf"),
+        "end": _day(args.end) if args.end else float("inf"),
+        "detector": args.detector,
+        "max_distance_m": args.max_distance_m,
+        "dwell_radius_m": args.dwell_radius_m,
+        "dwell_minutes": args.dwell_minutes,
+    }
+    spill_dir = None
+    # spawn: every worker opens its own MongoDB connection
+    with ProcessPoolExecutor(args.workers, mp_context=get_context("spawn")) as pool:
+        try:
+            if args.input:
+                # Map: workers parse pieces of the export and spill their points by vessel partition
+                spill_dir = settings["spill_dir"] = tempfile.mkdtemp(prefix="replay-")
+                settings["partitions"] = args.partitions or args.workers * 8
+                chunks = input_chunks(args.input, args.workers * 4)
+                total = sum(pool.map(spill_chunk, chunks, range(len(chunks)), [settings] * len(chunks)))
+                tasks = [
+                    ("spill", [os.path.join(spill_dir, name) for name in os.listdir(spill_dir)
+                               if name.startswith(f"part-{index}-")])
+                    for index in range(settings["partitions"])
+                ]
+                print(f"[Replay] {total} point(s) split into {settings['partitions']} partition(s)")
+            else:
+                query = _date_range_query(settings["start"], settings["end"])
+                vessel_ids = sorted(vessels_locations.distinct("vesselId", query))
+                tasks = [("mongo", vessel_ids[i:i + VESSELS_PER_TASK])
+                         for i in range(0, len(vessel_ids), VESSELS_PER_TASK)]
+                print(f"[Replay] {len(vessel_ids)} vessel(s) in {len(tasks)} task(s)")
+
+            # Then every vessel's whole track is analysed in one task
+            results = list(pool.map(analyse_partition, tasks, [settings] * len(tasks)))
+        finally:
+            if spill_dir:
+                shutil.rmtree(spill_dir, ignore_errors=True)
+
+    times = np.concatenate([np.empty(0)] + [result["times"] for result in results])
+    lats = np.concatenate([np.empty(0)] + [result["lats"] for result in results])
+    lngs = np.concatenate([np.empty(0)] + [result["lngs"] for result in results])
+    vessels = [vessel_id for result in results for vessel_id in result["vessels"]]
+    order = np.argsort(times, kind="stable")
+    candidates = (times[order], [vessels[i] for i in order], lats[order], lngs[order])
+    until = max((result["last"] for result in results), default=float("-inf"))
+    hotspots = simulate_hotspots(candidates, args.hotspot_radius_m, args.unused_days,
+                                 args.check_minutes, until, args.touch_on_revisit)
+
+    for i in range(0, len(hotspots), INSERT_BATCH):
+        target.insert_many(hotspots[i:i + INSERT_BATCH], ordered=False)
+
+    active = sum(hotspot["status"] == "active" for hotspot in hotspots)
+    print(
+        f"[Replay] {sum(r['points'] for r in results)} point(s) of {sum(r['tracks'] for r in results)} vessel(s), "
+        f"{sum(r['sessions'] for r in results)} activity session(s), {len(times)} candidate(s) → "
+        f"{len(hotspots)} hotspot(s) ({active} still active) written to {args.target} "
+        f"in {time.perf_counter() - started:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,89 @@
 import os
-import math
-import requests
+import time
+import numpy as np
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime, timedelta
-from .database import hotspots_vessels, vessels_locations, fishing_locations
+from .database import hotspots_vessels, vessels_locations, fishing_locations, vessel_latest
+from .spatial import active_hotspot_index
+from .cache import suggestion_cache
+from .occupancy import release_slots
+from .utils import haversine_np
+from .hotspot_service import create_hotspots
+from .timeseries import ROLLUP_AFTER_DAYS, rollup_vessel_locations
+from .tiles import SUGGESTION_TILES, refresh_suggestion_tiles, rebuild_suggestion_tiles
+from .dwell import DWELL_DETECTION, follow_vessel_locations
+from .metrics import instrument_job, record_job_event, JOB_EVENT_MASK
+from .leader import leader_only, job_leases, LEADER_ELECTION_ENABLED, LEASE_SECONDS
 
 # Create the scheduler instance
-scheduler = BackgroundScheduler(timezone="UTC") 
+# A run still going when the next one is due is skipped, and runs missed
+# while the process was busy are merged into one
+scheduler = BackgroundScheduler(
+    timezone="UTC",
+    job_defaults={"max_instances": 1, "coalesce": True, "misfire_grace_time": 30},
+)
+scheduler.add_listener(record_job_event, JOB_EVENT_MASK)
 
 # ------------------------------------------------------------
 # Job 1 ------------------------------------------------------
 
+@leader_only
+@instrument_job
 def check_vessel_activity():
     """
     Background task to check vessel activity and update statuses.
     If no activity is found for a vessel in the last 15 minutes, mark it inactive.
+
+    One `distinct` over vessel_latest finds every vessel that reported in
+    the window; the active links of the other vessels are deactivated with
+    one `update_many` per affected hotspot, whose occupancy is released.
     """
     try:
-        # Define the time range (last 15 minutes)
+        started = time.perf_counter()
+
+        # Define the time range (last 15 minutes). dateTime is written by
+        # save_vessel_location as a local-time ISO string, so compare the same way.
         now = datetime.now()
         fifteen_minutes_ago = now - timedelta(minutes=15)
 
-        # Get all vessels with status = 1 in hotspots_vessels
-        active_count = hotspots_vessels.find({"status": 1})
-
-        if active_count == 0:
-            print(f"[{now.isoformat()}] No active vessels found in hotspots_vessels.")
-        else:
-            # Iterate only once – reuse the cursor
-            for vessel in hotspots_vessels.find({"status": 1}):
-                vessel_id  = vessel["vesselId"]
-                hotspot_id = vessel["hotspotId"]
-
-                activity_count = vessels_locations.count_documents({
-                    "vesselId": vessel_id,
-                    "timestamp": {"$gte": fifteen_minutes_ago}
-                })
-
-                if activity_count == 0:
-                    hotspots_vessels.update_one(
-                        {"_id": vessel["_id"]},
-                        {"$set": {"status": 0}}
-                    )
-                    print(
-                        f"[{now.isoformat()}] Updated vessel {vessel_id} at "
-                        f"hotspot {hotspot_id} to inactive."
-                    )
-
-            print(f"[{now.isoformat()}] check_vessel_activity completed.")
+        recently_seen = vessel_latest.distinct(
+            "_id", {"lastSeen": {"$gte": fifteen_minutes_ago.isoformat()}}
+        )
+
+        # Active links of vessels not seen in the window, grouped by hotspot
+        stale_by_hotspot = hotspots_vessels.aggregate([
+            {"$match": {"status": 1, "vesselId": {"$nin": recently_seen}}},
+            {"$group": {"_id": "$hotspotId", "linkIds": {"$push": "$_id"}}},
+        ])
+
+        # Deactivate per hotspot so each freed slot is released exactly once
+        released = {}
+        for group in stale_by_hotspot:
+            result = hotspots_vessels.update_many(
+                {"_id": {"$in": group["linkIds"]}, "status": 1},
+                {"$set": {"status": 0}}
+            )
+            if result.modified_count:
+                released[group["_id"]] = result.modified_count
+        release_slots(released)
+        suggestion_cache.invalidate_hotspots(released)
+        modified_count = sum(released.values())
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(
+            f"[{now.isoformat()}] check_vessel_activity completed – "
+            f"{modified_count} link(s) set inactive, "
+            f"{len(recently_seen)} vessel(s) active, {elapsed_ms:.0f} ms."
+        )
+        return modified_count
 
     except Exception as e:
         print(f"An error occurred in check_vessel_activity: {e}")
+        raise
 
 
 # Add jobs to the scheduler
-scheduler.add_job(check_vessel_activity, "interval", minutes=1)
+scheduler.add_job(check_vessel_activity, "interval", minutes=1, id="check_vessel_activity")
 
 
 
@@ -62,131 +91,196 @@ scheduler.add_job(check_vessel_activity, "interval", minutes=1)
 # Job 2  – save_fishing_location trigger -----------------
 
 MAX_DISTANCE_M = float(os.getenv("MAX_DISTANCE_THRESHOLD", "1000"))  # metres
-API_BASE_URL   = os.getenv("API_BASE_URL", "http://localhost:8000").rstrip("/")
-SAVE_URL       = f"{API_BASE_URL}/save_fishing_location"
-
-
-def haversine_m(lat1, lon1, lat2, lon2) -> float:
-    """Great-circle distance in *metres* between two lat/lon points."""
-    R = 6_371_000  # Earth radius in metres
-    rlat1, rlat2 = math.radians(lat1), math.radians(lat2)
-    d_lat = math.radians(lat2 - lat1)
-    d_lon = math.radians(lon2 - lon1)
-    a = (
-        math.sin(d_lat / 2) ** 2
-        + math.cos(rlat1) * math.cos(rlat2) * math.sin(d_lon / 2) ** 2
-    )
-    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 
+def first_last_positions(window_start_iso):
+    """
+    One aggregation returning, per vessel that reported since
+    `window_start_iso`, its oldest and newest position in the window.
+    Read from vessels_locations itself (sorted on the vesselId + dateTime
+    index): vessel_latest.recent is capped and kept in arrival order, so a
+    busy or late-reporting vessel's window would start at the wrong point.
+    """
+    return list(vessels_locations.aggregate([
+        {"$match": {"dateTime": {"$gte": window_start_iso}}},
+        {"$sort": {"vesselId": 1, "dateTime": 1}},
+        {"$group": {
+            "_id": "$vesselId",
+            "firstLat": {"$first": "$lat"},
+            "firstLng": {"$first": "$lng"},
+            "lastLat": {"$last": "$lat"},
+            "lastLng": {"$last": "$lng"},
+            "points": {"$sum": 1},
+        }},
+        {"$match": {"points": {"$gte": 2}}},  # not enough data otherwise
+    ], allowDiskUse=True))
+
+
+@leader_only
+@instrument_job
 def scan_fishing_activity():
     """
     For each vessel that has location records in the last hour, calculate
     the straight-line distance covered.  If distance ≤ MAX_DISTANCE_M,
-    POST a fishing-location record.
+    create a fishing hotspot at its latest position.
     """
     try:
-        now_iso = datetime.utcnow().isoformat()
-        window_start_iso = (datetime.utcnow() - timedelta(minutes=60)).isoformat()
-
-        # Every vessel that reported at least once in the last 60 min
-        vessel_ids = vessels_locations.distinct(
-            "vesselId", {"dateTime": {"$gte": window_start_iso}}
+        # dateTime is written with datetime.now(), so build the window the same way
+        now_iso = datetime.now().isoformat()
+        window_start_iso = (datetime.now() - timedelta(minutes=60)).isoformat()
+
+        # Oldest and newest track point of every vessel seen in the last 60 min
+        tracks = first_last_positions(window_start_iso)
+        if not tracks:
+            print(f"[{now_iso}] scan_fishing_activity finished – no vessel tracks.")
+            return 0
+
+        # Displacement of every vessel in one vectorized pass
+        distances = haversine_np(
+            np.array([t["firstLat"] for t in tracks], dtype=float),
+            np.array([t["firstLng"] for t in tracks], dtype=float),
+            np.array([t["lastLat"] for t in tracks], dtype=float),
+            np.array([t["lastLng"] for t in tracks], dtype=float),
         )
 
-        for vessel_id in vessel_ids:
-            # Oldest → newest track points in the window
-            track = list(
-                vessels_locations.find(
-                    {"vesselId": vessel_id, "dateTime": {"$gte": window_start_iso}}
-                ).sort("dateTime", 1)
-            )
-            if len(track) < 2:
-                continue  # not enough data
-
-            first, last = track[0], track[-1]
-            dist_m = haversine_m(
-                float(first["lat"]), float(first["lng"]),
-                float(last["lat"]),  float(last["lng"])
-            )
-
-            if dist_m <= MAX_DISTANCE_M:
-                payload = {
-                    "id": f"{int(vessel_id):03d}|0001",
-                    "l":  f'{last["lat"]}|{last["lng"]}',
-                    "f": 1
-                }
-                try:
-                    requests.post(SAVE_URL, json=payload, timeout=10)
-                    print(
-                        f"[{now_iso}] Fishing spot saved for vessel {vessel_id} "
-                        f"(travelled {dist_m:.0f} m ≤ {MAX_DISTANCE_M} m)"
-                    )
-                except Exception as e:
-                    print(f"[Scheduler] POST to save_fishing_location failed: {e}")
-
-        print(f"[{now_iso}] scan_fishing_activity finished.")
+        stationary = np.flatnonzero(distances <= MAX_DISTANCE_M)
+        candidates = [
+            {
+                "vesselId": tracks[index]["_id"],
+                "messageId": None,
+                "latitude": float(tracks[index]["lastLat"]),
+                "longitude": float(tracks[index]["lastLng"]),
+                "f": 1,
+            }
+            for index in stationary
+        ]
+
+        # Dedup and insert every stationary vessel's position in one batch
+        results = create_hotspots(candidates)
+        for index, result in zip(stationary, results):
+            if result["status"] == "success" and not result.get("merged"):
+                print(
+                    f"[{now_iso}] Fishing spot {result['data']['hotspotId']} saved for vessel "
+                    f"{tracks[index]['_id']} (travelled {distances[index]:.0f} m ≤ {MAX_DISTANCE_M} m)"
+                )
+
+        created = sum(result["status"] == "success" and not result.get("merged") for result in results)
+        print(f"[{now_iso}] scan_fishing_activity finished – {len(tracks)} vessel track(s) scanned, "
+              f"{created} hotspot(s) created.")
+        return created
 
     except Exception as e:
         print(f"[Scheduler] scan_fishing_activity error: {e}")
-
-
-# Run this job every 1 minutes (adjust as needed)
-scheduler.add_job(scan_fishing_activity, "interval", minutes=1)
+        raise
+
+
+# Run this job every 1 minutes (adjust as needed). With DWELL_DETECTION on,
+# fishing is detected as locations arrive instead (see app/dwell.py)
+if DWELL_DETECTION == "off":
+    scheduler.add_job(scan_fishing_activity, "interval", minutes=1, id="scan_fishing_activity")
+elif DWELL_DETECTION == "changestream":
+    # Restarts the change stream follower if it stopped; the lease keeps it to one worker
+    scheduler.add_job(
+        leader_only(follow_vessel_locations),
+        "interval",
+        seconds=10,
+        id="follow_vessel_locations"
+    )
 
 # ------------------------------------------------------------
 # Job 3  – remove the unused hotspots trigger -----------------
 
 UNUSED_HOTSPOT_DAYS = int(os.getenv("UNUSED_HOTSPOT_DAYS", "3"))
-CHECK_INTERVAL_MIN = UNUSED_HOTSPOT_DAYS * 24 * 60
-
+CHECK_INTERVAL_MIN = int(os.getenv("UNUSED_HOTSPOT_CHECK_MINUTES", "60"))
 
+@leader_only
+@instrument_job
 def deactivate_unused_hotspots():
     """
-    Every N days:
-    • Look back N days in `hotspots_vessels`
-    • Collect hotspotIds that *have* been used in that window
-    • Any hotspot still marked active in `fishing_locations`
-      but *not* in that list → set status to 'inactive'.
+    Every CHECK_INTERVAL_MIN minutes:
+    • Any hotspot still marked active in `fishing_locations` whose
+      `lastUsedDateTime` (set on creation and on every vessel link) is
+      older than N days → set status to 'inactive'.
+
+    A single update_many on the (status, lastUsedDateTime) index does the
+    work; the changed hotspotIds are read back by their inactivation stamp
+    and returned, after the suggestion cache and hotspot index dropped them.
     """
     try:
         now_utc   = datetime.utcnow()
-        cutoff_iso = (now_utc - timedelta(days=UNUSED_HOTSPOT_DAYS)).isoformat()
+        cutoff = now_utc - timedelta(days=UNUSED_HOTSPOT_DAYS)
+        stamp = now_utc.isoformat()
 
-        # hotspotIds used in the look-back window
-        recent_hotspots = hotspots_vessels.distinct(
-            "hotspotId",
-            {"dateTime": {"$gte": cutoff_iso}}
+        stale = {"status": "active", "lastUsedDateTime": {"$lt": cutoff}}
+        result = fishing_locations.update_many(
+            stale,
+            {"$set": {"status": "inactive", "inactivatedDateTime": stamp}}
         )
-        recent_set = set(recent_hotspots)
-
-        # All hotspots still flagged active
-        unused_cursor = fishing_locations.find({
-            "status": "active",
-            "hotspotId": {"$nin": list(recent_set)}
-        })
-
-        changed = 0
-        for doc in unused_cursor:
-            fishing_locations.update_one(
-                {"_id": doc["_id"]},
-                {"$set": {"status": "inactive",
-                          "inactivatedDateTime": now_utc.isoformat()}}
-            )
-            changed += 1
-            print(f"[{now_utc.isoformat()}] Hotspot {doc['hotspotId']} set inactive.")
 
-        print(f"[{now_utc.isoformat()}] deactivate_unused_hotspots finished – "
-              f"{changed} hotspot(s) updated.")
+        deactivated_ids = []
+        if result.modified_count:
+            deactivated_ids = fishing_locations.distinct("hotspotId", {
+                "status": "inactive",
+                "lastUsedDateTime": {"$lt": cutoff},
+                "inactivatedDateTime": stamp,
+            })
+            suggestion_cache.invalidate_hotspots(deactivated_ids)
+            active_hotspot_index.remove(deactivated_ids)
+
+        print(f"[{stamp}] deactivate_unused_hotspots finished – "
+              f"{result.modified_count} hotspot(s) updated {deactivated_ids}.")
+        return deactivated_ids
 
     except Exception as e:
         print(f"[Scheduler] deactivate_unused_hotspots error: {e}")
+        raise
 
 
-# Register the job (interval = N days)
+# Register the job (interval = CHECK_INTERVAL_MIN minutes)
 scheduler.add_job(
     deactivate_unused_hotspots,
     "interval",
     minutes=CHECK_INTERVAL_MIN,
     id="deactivate_unused_hotspots"
 )
+
+# ------------------------------------------------------------
+# Job 4  – downsample old vessel tracks -----------------------
+
+if ROLLUP_AFTER_DAYS > 0:
+    scheduler.add_job(
+        leader_only(instrument_job(rollup_vessel_locations)),
+        "interval",
+        hours=24,
+        id="rollup_vessel_locations"
+    )
+
+# ------------------------------------------------------------
+# Job 5  – precomputed suggestion tiles -----------------------
+# New or moved hotspots mark the tiles around them dirty; the refresh
+# recomputes only those, the daily rebuild also drops tiles left empty.
+
+if SUGGESTION_TILES:
+    scheduler.add_job(
+        leader_only(instrument_job(refresh_suggestion_tiles)),
+        "interval",
+        seconds=int(os.getenv("SUGGESTION_TILE_REFRESH_SECONDS", "30")),
+        id="refresh_suggestion_tiles"
+    )
+    scheduler.add_job(
+        leader_only(instrument_job(rebuild_suggestion_tiles)),
+        "interval",
+        hours=24,
+        id="rebuild_suggestion_tiles"
+    )
+
+# ------------------------------------------------------------
+# Lease heartbeat – keeps this worker's job leases alive -------
+
+if LEADER_ELECTION_ENABLED:
+    scheduler.add_job(
+        job_leases.renew,
+        "interval",
+        seconds=max(LEASE_SECONDS // 3, 1),
+        id="renew_job_leases"
+    )
@@ -0,0 +1,286 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from .database import fishing_locations, USE_GEO_QUERIES
+from .utils import haversine, geo_point
+
+METERS_PER_DEGREE = 111_320  # Length of one degree of latitude in metres
+EARTH_RADIUS_KM = 6371
+HOTSPOT_GEOHASH_PRECISION = 7  # Stored on every hotspot (~150 m cells); coarser cells are its prefixes
+
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat, lon, precision=6):
+    """Standard base32 geohash of a point."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_bbox(geohash):
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (bits >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def geohash_center(geohash):
+    min_lat, min_lon, max_lat, max_lon = geohash_bbox(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+class GridIndex:
+    """
+    Process-local uniform lat/lon grid over hotspot points.
+
+    Each point is bucketed into a cell of `cell_deg` degrees, so a radius
+    query only runs haversine() on the points of the cells it overlaps.
+    """
+
+    def __init__(self, cell_deg):
+        self.cell_deg = cell_deg
+        self._cells = {}    # (row, col) -> {key: (lat, lon)}
+        self._points = {}   # key -> (lat, lon)
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def get(self, key):
+        return self._points.get(key)
+
+    def clear(self):
+        self._cells.clear()
+        self._points.clear()
+
+    def add(self, key, lat, lon):
+        """Insert (or move) a point."""
+        self.remove(key)
+        self._points[key] = (lat, lon)
+        self._cells.setdefault(self._cell(lat, lon), {})[key] = (lat, lon)
+
+    def remove(self, key):
+        point = self._points.pop(key, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def query_radius(self, lat, lon, radius_m):
+        """Return [(key, distance_m)] for every point within `radius_m` metres."""
+        d_lat = radius_m / METERS_PER_DEGREE
+        d_lon = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+        row_min, col_min = self._cell(lat - d_lat, lon - d_lon)
+        row_max, col_max = self._cell(lat + d_lat, lon + d_lon)
+
+        hits = []
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                for key, (p_lat, p_lon) in self._cells.get((row, col), {}).items():
+                    distance = haversine(lat, lon, p_lat, p_lon)
+                    if distance <= radius_m:
+                        hits.append((key, distance))
+        return hits
+
+
+def _distance_km_expr(latitude, longitude):
+    """Aggregation expression computing the haversine distance (km) to the hotspot."""
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    lat2 = {"$degreesToRadians": "$latitude"}
+    lon2 = {"$degreesToRadians": "$longitude"}
+    a = {"$add": [
+        {"$pow": [{"$sin": {"$divide": [{"$subtract": [lat2, lat1]}, 2]}}, 2]},
+        {"$multiply": [
+            math.cos(lat1),
+            {"$cos": lat2},
+            {"$pow": [{"$sin": {"$divide": [{"$subtract": [lon2, lon1]}, 2]}}, 2]},
+        ]},
+    ]}
+    return {"$multiply": [2 * EARTH_RADIUS_KM, {"$asin": {"$sqrt": a}}]}
+
+
+def nearby_stages(latitude, longitude, max_distance_km):
+    """Pipeline head yielding active hotspots within range, with `distanceKm` set."""
+    if USE_GEO_QUERIES:
+        # Let MongoDB filter by distance on the 2dsphere index
+        return [{
+            "$geoNear": {
+                "near": geo_point(latitude, longitude),
+                "distanceField": "distanceKm",
+                "distanceMultiplier": 0.001,
+                "maxDistance": max_distance_km * 1000,
+                "query": {"status": "active"},
+                "spherical": True,
+            }
+        }]
+
+    # Without the 2dsphere index: bounding-box prefilter, then exact distance server-side
+    d_lat = math.degrees(max_distance_km / EARTH_RADIUS_KM)
+    d_lon = d_lat / max(math.cos(math.radians(latitude)), 1e-6)
+    return [
+        {"$match": {
+            "status": "active",
+            "latitude": {"$gte": latitude - d_lat, "$lte": latitude + d_lat},
+            "longitude": {"$gte": longitude - d_lon, "$lte": longitude + d_lon},
+        }},
+        {"$addFields": {"distanceKm": _distance_km_expr(latitude, longitude)}},
+        {"$match": {"distanceKm": {"$lte": max_distance_km}}},
+    ]
+
+
+class ActiveHotspotIndex:
+    """
+    Spatial index over `status: "active"` hotspots, keyed by hotspotId.
+
+    The index is built lazily from MongoDB on first use (cold start), pulls
+    hotspots inserted by other workers every HOTSPOT_INDEX_SYNC_SECONDS
+    (by hotspotId, indexed with status) and is rebuilt every
+    HOTSPOT_INDEX_REBUILD_SECONDS so deactivations made elsewhere are
+    eventually dropped too. Rebuilds load a new grid in a background thread
+    and swap it in, so lookups never wait for a full reload.
+    """
+
+    # hotspotIds are reserved before the insert, so a lower id can land after
+    # a higher one: each sync re-reads the ids above the highest one seen this
+    # many syncs ago, and the rebuild catches anything slower
+    SYNC_OVERLAP = 3
+    PROJECTION = {"hotspotId": 1, "latitude": 1, "longitude": 1}
+
+    def __init__(self, collection, radius_m):
+        self.collection = collection
+        # Cells the size of the dedup radius keep radius queries to a 3x3 block
+        self.grid = GridIndex(cell_deg=max(radius_m, 1.0) / METERS_PER_DEGREE)
+        self.sync_seconds = float(os.getenv("HOTSPOT_INDEX_SYNC_SECONDS", 5))
+        self.rebuild_seconds = float(os.getenv("HOTSPOT_INDEX_REBUILD_SECONDS", 300))
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+        self._rebuilder = None
+        self._journal = None  # Changes made while a rebuild is loading, replayed onto its grid
+        self._last_id = None
+        self._watermarks = deque(maxlen=self.SYNC_OVERLAP)
+        self._synced_at = 0.0
+        self._built_at = None
+
+    def rebuild(self):
+        """Reload every active hotspot from MongoDB, then swap the new grid in."""
+        with self._rebuild_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                grid = GridIndex(cell_deg=self.grid.cell_deg)
+                last_id = None
+                for doc in self.collection.find({"status": "active"}, self.PROJECTION):
+                    grid.add(doc["hotspotId"], float(doc["latitude"]), float(doc["longitude"]))
+                    if last_id is None or doc["hotspotId"] > last_id:
+                        last_id = doc["hotspotId"]
+                with self._lock:
+                    for hotspot_id, point in self._journal:
+                        if point is None:
+                            grid.remove(hotspot_id)
+                        else:
+                            grid.add(hotspot_id, *point)
+                    self.grid = grid
+                    self._note_id(last_id)
+                    self._built_at = self._synced_at = time.monotonic()
+            finally:
+                with self._lock:
+                    self._journal = None
+        print(f"[HotspotIndex] rebuilt with {len(grid)} active hotspot(s)")
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            print(f"[HotspotIndex] background rebuild failed: {e}")
+
+    def _note_id(self, hotspot_id):
+        if hotspot_id is not None and (self._last_id is None or hotspot_id > self._last_id):
+            self._last_id = hotspot_id
+
+    def _put(self, hotspot_id, point):
+        """Add (point) or remove (None) a hotspot, recording it for a rebuild in progress."""
+        if point is None:
+            self.grid.remove(hotspot_id)
+        else:
+            self.grid.add(hotspot_id, *point)
+            self._note_id(hotspot_id)
+        if self._journal is not None:
+            self._journal.append((hotspot_id, point))
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._built_at >= self.rebuild_seconds and (self._rebuilder is None or not self._rebuilder.is_alive()):
+            self._rebuilder = threading.Thread(target=self._rebuild_in_background, name="hotspot-index", daemon=True)
+            self._rebuilder.start()
+        if now - self._synced_at < self.sync_seconds:
+            return
+        query = {"status": "active"}
+        since = self._watermarks[0] if self._watermarks else self._last_id
+        if since is not None:
+            query["hotspotId"] = {"$gt": since}
+        for doc in self.collection.find(query, self.PROJECTION):
+            self._put(doc["hotspotId"], (float(doc["latitude"]), float(doc["longitude"])))
+        self._watermarks.append(self._last_id)
+        self._synced_at = now
+
+    def find_within(self, lat, lon, radius_m):
+        """Return [(hotspotId, distance_m)] of active hotspots within the radius."""
+        if self._built_at is None:
+            self.rebuild()  # cold start: nothing to answer from yet
+        with self._lock:
+            self._sync()
+            return self.grid.query_radius(lat, lon, radius_m)
+
+    def add(self, doc):
+        """Register a freshly inserted hotspot document."""
+        with self._lock:
+            if self._built_at is not None or self._journal is not None:
+                self._put(doc["hotspotId"], (float(doc["latitude"]), float(doc["longitude"])))
+
+    def remove(self, hotspot_ids):
+        """Drop deactivated hotspots."""
+        with self._lock:
+            for hotspot_id in hotspot_ids:
+                self._put(hotspot_id, None)
+
+
+# Shared index used by save_fishing_location and the scheduler
+LOCATION_RADIUS_METERS = float(os.getenv("LOCATION_RADIUS_METERS", 20))
+active_hotspot_index = ActiveHotspotIndex(fishing_locations, LOCATION_RADIUS_METERS)
@@ -0,0 +1,75 @@
+import json
+from datetime import datetime
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+CHUNK_SIZE = 500  # Documents serialized per chunk written to the socket
+
+
+def _default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _encode(document):
+    if isinstance(document.get("_id"), ObjectId):
+        document["_id"] = str(document["_id"])
+    return json.dumps(document, default=_default, separators=(",", ":"))
+
+
+def parse_keyset_cursor(after, sort_field, parse=str):
+    """
+    Decode an `after` cursor of the form "<sort value>|<_id>" into the filter
+    selecting the documents that follow it in (sort_field, _id) order.
+    `parse` converts the sort value to its stored type (e.g. datetime.fromisoformat).
+    """
+    value, _, oid = after.rpartition("|")
+    if not value or not ObjectId.is_valid(oid):
+        raise HTTPException(status_code=400, detail="Invalid format for 'after'")
+    try:
+        value = parse(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid format for 'after'")
+    return {"$or": [
+        {sort_field: {"$gt": value}},
+        {sort_field: value, "_id": {"$gt": ObjectId(oid)}},
+    ]}
+
+
+def keyset_cursor(document, sort_field):
+    """Cursor pointing just after `document` (pass it back as `after`)."""
+    value = document.get(sort_field)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return f"{value}|{document['_id']}"
+
+
+def stream_documents(cursor, fmt="json", sort_field=None, limit=0):
+    """
+    Stream a pymongo cursor as NDJSON or as a `{"status": "success", "data": [...]}`
+    JSON body, without materializing it. In JSON mode a full page (`limit`
+    documents) also carries a `next` keyset cursor.
+    """
+    def chunks(wrap):
+        buffered, last, count = [], None, 0
+        if wrap:
+            yield '{"status":"success","data":['
+        for document in cursor:
+            last = document
+            count += 1
+            line = _encode(document)
+            buffered.append(line if not wrap or count == 1 else "," + line)
+            if len(buffered) >= CHUNK_SIZE:
+                yield ("" if wrap else "\n").join(buffered) + ("" if wrap else "\n")
+                buffered = []
+        if buffered:
+            yield ("" if wrap else "\n").join(buffered) + ("" if wrap else "\n")
+        if wrap:
+            next_cursor = None
+            if limit and count == limit and sort_field:
+                next_cursor = keyset_cursor(last, sort_field)
+            yield "]," + '"next":' + json.dumps(next_cursor) + "}"
+
+    if fmt == "ndjson":
+        return StreamingResponse(chunks(wrap=False), media_type="application/x-ndjson")
+    return StreamingResponse(chunks(wrap=True), media_type="application/json")
@@ -0,0 +1,160 @@
+import math
+import os
+from datetime import datetime
+from pymongo import UpdateOne
+from .database import fishing_locations, suggestion_tiles
+from .spatial import METERS_PER_DEGREE, geohash_bbox, geohash_center, geohash_encode, nearby_stages
+from .utils import haversine
+
+# Opt-in: serve suggest_fishing_hotspots from precomputed geohash tiles
+SUGGESTION_TILES = os.getenv("SUGGESTION_TILES", "false").lower() == "true"
+TILE_PRECISION = int(os.getenv("SUGGESTION_TILE_PRECISION", 4))  # ~39 x 20 km tiles
+TILE_SIZE = int(os.getenv("SUGGESTION_TILE_SIZE", 50))  # Candidates kept per tile
+TILE_RADIUS_KM = float(os.getenv("MAX_DISTANCE_THRESHOLD", 50.0))
+
+# A tile holds the TILE_SIZE most recent active hotspots within
+# TILE_RADIUS_KM + its half diagonal of its centre: a superset of what any
+# caller inside the tile can see, already in the suggestion order. Status
+# and occupancy change far more often than positions, so they are not
+# stored but read live for the few candidates a request looks at; only a
+# hotspot appearing or moving marks the tiles around it dirty.
+TILE_CANDIDATE_FIELDS = ("hotspotId", "latitude", "longitude", "currentDateTime", "reportCount", "density")
+
+
+def tile_half_diagonal_m(tile):
+    min_lat, min_lon, max_lat, max_lon = geohash_bbox(tile)
+    return haversine(min_lat, min_lon, max_lat, max_lon) / 2
+
+
+def tiles_covering(lat, lon, radius_km=TILE_RADIUS_KM):
+    """Tiles whose candidate area (radius + half diagonal around the centre) contains the point."""
+    own = geohash_encode(lat, lon, TILE_PRECISION)
+    min_lat, min_lon, max_lat, max_lon = geohash_bbox(own)
+    height, width = max_lat - min_lat, max_lon - min_lon
+    reach_m = radius_km * 1000 + tile_half_diagonal_m(own)
+    rows = math.ceil(reach_m / METERS_PER_DEGREE / height)
+    cols = math.ceil(reach_m / METERS_PER_DEGREE / max(math.cos(math.radians(lat)), 1e-6) / width)
+
+    center_lat, center_lon = geohash_center(own)
+    tiles = set()
+    for row in range(-rows, rows + 1):
+        tile_lat = center_lat + row * height
+        if not -90 < tile_lat < 90:
+            continue
+        for col in range(-cols, cols + 1):
+            tile_lon = (center_lon + col * width + 180) % 360 - 180
+            if haversine(tile_lat, tile_lon, lat, lon) <= reach_m:
+                tiles.add(geohash_encode(tile_lat, tile_lon, TILE_PRECISION))
+    return tiles
+
+
+def compute_tile(tile):
+    """Ranked candidates of one tile: {"candidates": [...], "truncated": bool}."""
+    center_lat, center_lon = geohash_center(tile)
+    radius_km = TILE_RADIUS_KM + tile_half_diagonal_m(tile) / 1000
+    docs = list(fishing_locations.aggregate(nearby_stages(center_lat, center_lon, radius_km) + [
+        {"$sort": {"currentDateTime": -1, "hotspotId": 1}},
+        {"$limit": TILE_SIZE + 1},
+        {"$project": {"_id": 0, **{field: 1 for field in TILE_CANDIDATE_FIELDS}}},
+    ]))
+    return {"candidates": docs[:TILE_SIZE], "truncated": len(docs) > TILE_SIZE}
+
+
+def mark_tiles_dirty(points):
+    """Flag (creating if needed) every tile that could list a hotspot at one of these (lat, lon) points."""
+    if not SUGGESTION_TILES:
+        return 0
+    tiles = set()
+    for lat, lon in points:
+        tiles |= tiles_covering(float(lat), float(lon))
+    if tiles:
+        now = datetime.utcnow()
+        suggestion_tiles.bulk_write([
+            UpdateOne({"_id": tile}, {"$set": {"dirty": True, "dirtyAt": now}}, upsert=True)
+            for tile in tiles
+        ], ordered=False)
+    return len(tiles)
+
+
+def refresh_suggestion_tiles():
+    """
+    Recompute the dirty tiles (every tile on first run). A tile marked dirty
+    again while it was being computed keeps its flag for the next run.
+    Returns the number of tiles written.
+    """
+    if suggestion_tiles.estimated_document_count() == 0:
+        return rebuild_suggestion_tiles()
+
+    written = 0
+    for doc in suggestion_tiles.find({"dirty": True}, {"dirtyAt": 1}):
+        fields = compute_tile(doc["_id"])
+        result = suggestion_tiles.update_one(
+            {"_id": doc["_id"], "dirty": True, "dirtyAt": doc.get("dirtyAt")},
+            {"$set": {**fields, "radiusKm": TILE_RADIUS_KM, "builtAt": datetime.utcnow(), "dirty": False}},
+        )
+        written += result.modified_count
+    print(f"[Tiles] refresh_suggestion_tiles – {written} tile(s) recomputed.")
+    return written
+
+
+def rebuild_suggestion_tiles():
+    """Mark every tile around an active hotspot dirty, drop the others, then recompute them all."""
+    cells = fishing_locations.aggregate([
+        {"$match": {"status": "active"}},
+        {"$group": {"_id": {"$substrCP": ["$geohash", 0, TILE_PRECISION]}}},
+    ])
+    # Every tile reaching into a hotspot tile covers the points of that tile
+    tiles = set()
+    for cell in cells:
+        if cell["_id"]:
+            center_lat, center_lon = geohash_center(cell["_id"])
+            tiles |= tiles_covering(center_lat, center_lon, TILE_RADIUS_KM + tile_half_diagonal_m(cell["_id"]) / 1000)
+
+    now = datetime.utcnow()
+    if tiles:
+        suggestion_tiles.bulk_write([
+            UpdateOne({"_id": tile}, {"$set": {"dirty": True, "dirtyAt": now}}, upsert=True)
+            for tile in tiles
+        ], ordered=False)
+    removed = suggestion_tiles.delete_many({"dirtyAt": {"$lt": now}}).deleted_count
+    print(f"[Tiles] rebuild_suggestion_tiles – {len(tiles)} tile(s) to build, {removed} dropped.")
+    return refresh_suggestion_tiles() if tiles else 0
+
+
+def suggest_from_tile(latitude, longitude, max_distance_km, max_vessels_per_hotspot, limit):
+    """
+    Suggestions from the caller's tile, or None when the tile cannot answer
+    exactly (missing, dirty, built for a smaller radius, or its candidates
+    ran out before `limit` free hotspots were found).
+    """
+    tile = suggestion_tiles.find_one({"_id": geohash_encode(latitude, longitude, TILE_PRECISION)})
+    if tile is None or tile.get("dirty") or max_distance_km > tile.get("radiusKm", 0):
+        return None
+
+    in_range = [
+        candidate for candidate in tile["candidates"]
+        if haversine(latitude, longitude, float(candidate["latitude"]), float(candidate["longitude"]))
+        <= max_distance_km * 1000
+    ]
+    live = {
+        doc["hotspotId"]: doc.get("vesselCount") or 0
+        for doc in fishing_locations.find(
+            {"hotspotId": {"$in": [candidate["hotspotId"] for candidate in in_range]}, "status": "active"},
+            {"hotspotId": 1, "vesselCount": 1},
+        )
+    }
+
+    suggestions = []
+    for candidate in in_range:
+        vessel_count = live.get(candidate["hotspotId"])
+        if vessel_count is None or vessel_count >= max_vessels_per_hotspot:
+            continue
+        suggestions.append({
+            **candidate,
+            "vesselCount": vessel_count,
+            "availableSlots": max_vessels_per_hotspot - vessel_count,
+        })
+        if len(suggestions) == limit:
+            return suggestions
+    # Older hotspots past the end of a full tile might still qualify
+    return None if tile["truncated"] else suggestions
@@ -0,0 +1,179 @@
+import os
+import time
+from datetime import datetime, timedelta
+from pymongo import ASCENDING
+from pymongo.errors import CollectionInvalid, OperationFailure
+from .database import db, vessels_locations, vessels_locations_rollup, counters
+
+# Store vessels_locations as a MongoDB time-series collection (metaField vesselId, timeField ts)
+TIMESERIES_ENABLED = os.getenv("VESSEL_LOCATIONS_TIMESERIES", "false").lower() == "true"
+# Raw points older than this are deleted by MongoDB (0 = keep forever)
+RAW_RETENTION_DAYS = int(os.getenv("RAW_LOCATION_RETENTION_DAYS", 0))
+# Points older than this are downsampled into vessels_locations_rollup (0 = no rollup)
+ROLLUP_AFTER_DAYS = int(os.getenv("ROLLUP_AFTER_DAYS", 0))
+ROLLUP_RESOLUTION_MINUTES = int(os.getenv("ROLLUP_RESOLUTION_MINUTES", 15))
+
+TIMESERIES_OPTIONS = {"timeField": "ts", "metaField": "vesselId", "granularity": "minutes"}
+# $dateTrunc counts binSize bins from this date
+ROLLUP_BIN_REFERENCE = datetime(2000, 1, 1)
+
+
+def _expire_after_seconds():
+    return RAW_RETENTION_DAYS * 24 * 3600 if RAW_RETENTION_DAYS > 0 else None
+
+
+def ensure_vessel_locations_storage():
+    """
+    Set up storage for vessels_locations: create it as a time-series
+    collection when enabled, and apply the raw-point retention (TTL).
+    """
+    if RAW_RETENTION_DAYS and ROLLUP_AFTER_DAYS and RAW_RETENTION_DAYS <= ROLLUP_AFTER_DAYS:
+        print("[TimeSeries] RAW_LOCATION_RETENTION_DAYS must be greater than ROLLUP_AFTER_DAYS, "
+              "otherwise points expire before they are rolled up")
+
+    options = list(db.list_collections(filter={"name": vessels_locations.name}))
+    is_timeseries = bool(options) and options[0].get("type") == "timeseries"
+
+    if TIMESERIES_ENABLED and not options:
+        kwargs = {"timeseries": TIMESERIES_OPTIONS}
+        if _expire_after_seconds():
+            kwargs["expireAfterSeconds"] = _expire_after_seconds()
+        try:
+            db.create_collection(vessels_locations.name, **kwargs)
+            is_timeseries = True
+            print(f"[TimeSeries] created time-series collection {vessels_locations.name}")
+        except CollectionInvalid:
+            pass  # created concurrently by another worker
+    elif TIMESERIES_ENABLED and not is_timeseries:
+        print(f"[TimeSeries] {vessels_locations.name} is a regular collection – "
+              "run `python -m app.manage migrate-timeseries` to convert it")
+
+    if is_timeseries:
+        db.command("collMod", vessels_locations.name, expireAfterSeconds=_expire_after_seconds() or "off")
+    elif _expire_after_seconds():
+        try:
+            vessels_locations.create_index([("ts", ASCENDING)], expireAfterSeconds=_expire_after_seconds())
+        except OperationFailure:
+            # The ts index exists with another retention: update it in place
+            db.command("collMod", vessels_locations.name, index={
+                "keyPattern": {"ts": 1}, "expireAfterSeconds": _expire_after_seconds(),
+            })
+    else:
+        try:
+            vessels_locations.create_index([("ts", ASCENDING)])
+        except OperationFailure as e:
+            print(f"[TimeSeries] ts index left unchanged (drop it to disable the TTL): {e}")
+
+    vessels_locations_rollup.create_index([("vesselId", ASCENDING), ("bucket", ASCENDING)], unique=True)
+
+
+def backfill_ts():
+    """Add the BSON `ts` date to vessel locations saved before it existed."""
+    result = vessels_locations.update_many(
+        {"ts": {"$exists": False}, "dateTime": {"$type": "string"}},
+        [{"$set": {"ts": {"$dateFromString": {"dateString": "$dateTime"}}}}],
+    )
+    print(f"[TimeSeries] backfill_ts – {result.modified_count} location(s) updated.")
+    return result.modified_count
+
+
+def migrate_to_timeseries(batch_size=10000):
+    """
+    Convert vessels_locations into a time-series collection. Time-series
+    collections cannot be renamed, so the existing collection is renamed to
+    <name>_legacy first, the time-series collection is created under the
+    original name and the points are copied over. Stop ingest while it runs.
+    """
+    backfill_ts()
+    name = vessels_locations.name
+    legacy_name = f"{name}_legacy"
+    vessels_locations.rename(legacy_name)
+
+    kwargs = {"timeseries": TIMESERIES_OPTIONS}
+    if _expire_after_seconds():
+        kwargs["expireAfterSeconds"] = _expire_after_seconds()
+    target = db.create_collection(name, **kwargs)
+
+    copied, batch = 0, []
+    for document in db[legacy_name].find({}, {"_id": 0}).sort("ts", ASCENDING).batch_size(batch_size):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            target.insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+    if batch:
+        target.insert_many(batch, ordered=False)
+        copied += len(batch)
+
+    print(f"[TimeSeries] migrated {copied} location(s); old collection kept as {legacy_name}")
+    return copied
+
+
+def _bucket_start(moment):
+    """Start of the ROLLUP_RESOLUTION_MINUTES bucket ($dateTrunc bin) containing `moment`."""
+    bin_size = timedelta(minutes=ROLLUP_RESOLUTION_MINUTES)
+    return moment - (moment - ROLLUP_BIN_REFERENCE) % bin_size
+
+
+def rollup_vessel_locations():
+    """
+    Downsample raw points older than ROLLUP_AFTER_DAYS into
+    vessels_locations_rollup: one document per vessel and
+    ROLLUP_RESOLUTION_MINUTES bucket (mean position, point count, first/last ts).
+    Only the range since the previous run is processed; both ends are bucket
+    boundaries, so every bucket is aggregated whole in a single run.
+    """
+    try:
+        started = time.perf_counter()
+        cutoff = _bucket_start(datetime.now() - timedelta(days=ROLLUP_AFTER_DAYS))
+        state = counters.find_one({"_id": "vessels_locations_rollup"}) or {}
+        watermark = state.get("until")
+        if watermark is not None:
+            # Watermarks saved before cutoffs were aligned: redo that bucket whole
+            watermark = _bucket_start(watermark)
+
+        match = {"ts": {"$lt": cutoff}}
+        if watermark is not None:
+            match["ts"]["$gte"] = watermark
+
+        vessels_locations.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": {
+                    "vesselId": "$vesselId",
+                    "bucket": {"$dateTrunc": {
+                        "date": "$ts", "unit": "minute", "binSize": ROLLUP_RESOLUTION_MINUTES,
+                    }},
+                },
+                "lat": {"$avg": "$lat"},
+                "lng": {"$avg": "$lng"},
+                "points": {"$sum": 1},
+                "firstTs": {"$min": "$ts"},
+                "lastTs": {"$max": "$ts"},
+            }},
+            {"$project": {
+                "_id": 0,
+                "vesselId": "$_id.vesselId",
+                "bucket": "$_id.bucket",
+                "lat": 1, "lng": 1, "points": 1, "firstTs": 1, "lastTs": 1,
+            }},
+            {"$merge": {
+                "into": vessels_locations_rollup.name,
+                "on": ["vesselId", "bucket"],
+                # Only a bucket redone whole (re-run, old unaligned watermark)
+                # matches: the larger sample is the complete one
+                "whenMatched": [{"$replaceWith": {"$cond": [
+                    {"$gte": ["$$new.points", "$points"]}, "$$new", "$$ROOT",
+                ]}}],
+                "whenNotMatched": "insert",
+            }},
+        ], allowDiskUse=True)
+
+        counters.update_one({"_id": "vessels_locations_rollup"}, {"$set": {"until": cutoff}}, upsert=True)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"[{datetime.now().isoformat()}] rollup_vessel_locations finished – "
+              f"points before {cutoff.isoformat()} rolled up, {elapsed_ms:.0f} ms.")
+
+    except Exception as e:
+        print(f"[Scheduler] rollup_vessel_locations error: {e}")
+        raise
@@ -1,6 +1,10 @@
 import math
+import operator
+from itertools import repeat
+import numpy as np
 from fastapi import HTTPException
-from .database import fishing_locations
+from pymongo import ReturnDocument
+from .database import fishing_locations, counters
 
 def parse_location_data(request):
     """Parse and validate location data."""
@@ -13,6 +17,74 @@ def parse_location_data(request):
         raise HTTPException(status_code=400, detail="Invalid format for 'id' or 'l'")
     return vessel_id, message_id, latitude, longitude
 
+def _split_pairs(values):
+    """
+    Split "a|b" strings with one split of the joined batch. Returns
+    (firsts, seconds, bad): items without exactly one "|" are flagged in
+    `bad` and come back as empty strings.
+    """
+    tokens = "|".join(values).split("|")
+    if len(tokens) == 2 * len(values) and all(map(operator.contains, values, repeat("|"))):
+        return tokens[0::2], tokens[1::2], np.zeros(len(values), dtype=bool)
+    # Some item has no "|" or several: blank them, then split again
+    array = np.array(values, dtype=object)
+    bad = np.char.count(array.astype(str), "|") != 1
+    array[bad] = "|"
+    tokens = "|".join(array.tolist()).split("|")
+    return tokens[0::2], tokens[1::2], bad
+
+def parse_location_batch(ids, locations):
+    """
+    Batch counterpart of parse_location_data for parallel `id` / `l` string lists.
+
+    Returns (rows, errors): rows is a list of
+    (index, vessel_id, message_id, latitude, longitude) for every valid item
+    and errors maps the index of every invalid item to its error message.
+    """
+    if not ids:
+        return [], {}
+    vessel_ids, message_ids, id_bad = _split_pairs(ids)
+    lat_strings, lng_strings, l_bad = _split_pairs(locations)
+    latitudes, lat_bad = to_float_array(lat_strings)
+    longitudes, lng_bad = to_float_array(lng_strings)
+    bad = id_bad | l_bad | lat_bad | lng_bad
+
+    valid = np.flatnonzero(~bad)
+    if len(valid) < len(ids):
+        vessel_ids = [vessel_ids[i] for i in valid.tolist()]
+        message_ids = [message_ids[i] for i in valid.tolist()]
+    rows = list(zip(
+        valid.tolist(),
+        vessel_ids,
+        message_ids,
+        np.round(latitudes[valid], 5).tolist(),
+        np.round(longitudes[valid], 5).tolist(),
+    ))
+    errors = dict.fromkeys(np.flatnonzero(bad).tolist(), "Invalid format for 'id' or 'l'")
+    return rows, errors
+
+def to_float_array(values):
+    """Convert strings to float64 in one call; unparsable items become NaN and are flagged."""
+    try:
+        return np.array(values, dtype=np.float64), np.zeros(len(values), dtype=bool)
+    except ValueError:
+        parsed = np.empty(len(values), dtype=np.float64)
+        bad = np.zeros(len(values), dtype=bool)
+        for position, value in enumerate(values):
+            try:
+                parsed[position] = float(value)
+            except ValueError:
+                parsed[position], bad[position] = np.nan, True
+        return parsed, bad
+
+def valid_position(latitude, longitude):
+    """True for a finite latitude in [-90, 90] and longitude in [-180, 180]."""
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return False
+    return -90 <= latitude <= 90 and -180 <= longitude <= 180  # NaN fails both
+
 def haversine(lat1, lon1, lat2, lon2):
     """Calculate distance using the Haversine formula."""
     R = 6371000  # Earth's radius in meters
@@ -23,28 +95,38 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
-def get_next_hotspot_id():
-    """Determine the next available hotspotId."""
-    last_hotspot = fishing_locations.find_one({}, sort=[("hotspotId", -1)], projection={"hotspotId": 1})
-    return 1 if not last_hotspot else last_hotspot["hotspotId"] + 1
+def haversine_np(lat1, lon1, lat2, lon2):
+    """Vectorized haversine distance in metres over NumPy arrays (or scalars)."""
+    R = 6371000  # Earth's radius in meters
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    delta_phi = phi2 - phi1
+    delta_lambda = np.radians(lon2) - np.radians(lon1)
+    a = np.sin(delta_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
+    return 2 * R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
-from fastapi import HTTPException
+def geo_point(latitude, longitude):
+    """GeoJSON point for the 2dsphere index (GeoJSON order is lng, lat)."""
+    return {"type": "Point", "coordinates": [longitude, latitude]}
 
-def parse_location_data(request):
-    """Parse and validate location data."""
-    try:
-        # Split ID into vessel ID and message ID
-        vessel_id, message_id = request.id.split("|")
-
-        # Split location into latitude and longitude
-        latitude, longitude = map(float, request.l.split("|"))
-        latitude = round(latitude, 5)
-        longitude = round(longitude, 5)
+def seed_hotspot_counter():
+    """
+    Make sure the hotspotId counter is at least the highest existing
+    hotspotId. Idempotent and safe to run from several workers at once.
+    """
+    last_hotspot = fishing_locations.find_one({}, sort=[("hotspotId", -1)], projection={"hotspotId": 1})
+    current_max = last_hotspot["hotspotId"] if last_hotspot else 0
+    counters.update_one({"_id": "hotspotId"}, {"$max": {"seq": current_max}}, upsert=True)
+    return current_max
 
-    except ValueError:
-        raise HTTPException(
-            status_code=400, detail="Invalid format for 'id' or 'l'"
+def reserve_hotspot_ids(count=1):
+    """Atomically reserve `count` consecutive hotspotIds and return the first one."""
+    counter = counters.find_one_and_update(
+        {"_id": "hotspotId"}, {"$inc": {"seq": count}}, return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        # Counter not seeded yet (fresh database): seed it from the collection, then retry
+        seed_hotspot_counter()
+        counter = counters.find_one_and_update(
+            {"_id": "hotspotId"}, {"$inc": {"seq": count}}, return_document=ReturnDocument.AFTER
         )
-
-    return vessel_id, message_id, latitude, longitude
-
+    return counter["seq"] - count + 1
@@ -0,0 +1,63 @@
+import os
+from pymongo import UpdateOne
+from .database import vessel_latest, vessels_locations
+
+# Number of most recent positions kept per vessel in `recent`
+VESSEL_LATEST_WINDOW = int(os.getenv("VESSEL_LATEST_WINDOW", 120))
+
+
+def update_vessel_latest(documents):
+    """
+    Fold freshly saved vessels_locations documents into `vessel_latest`:
+    one upsert per vessel sets the last position and last-seen time, bumps
+    the report count and appends to the rolling `recent` window.
+    """
+    by_vessel = {}
+    for document in documents:
+        by_vessel.setdefault(document["vesselId"], []).append(document)
+
+    operations = []
+    for vessel_id, points in by_vessel.items():
+        points.sort(key=lambda p: p["dateTime"])
+        last = points[-1]
+        operations.append(UpdateOne(
+            {"_id": vessel_id},
+            {
+                "$set": {"vesselId": vessel_id, "lat": last["lat"], "lng": last["lng"]},
+                "$max": {"lastSeen": last["dateTime"]},
+                "$min": {"firstSeen": points[0]["dateTime"]},
+                "$inc": {"reportCount": len(points)},
+                "$push": {"recent": {
+                    "$each": [{"lat": p["lat"], "lng": p["lng"], "dateTime": p["dateTime"]} for p in points],
+                    "$slice": -VESSEL_LATEST_WINDOW,
+                }},
+            },
+            upsert=True,
+        ))
+    if operations:
+        vessel_latest.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def rebuild_vessel_latest():
+    """Rebuild `vessel_latest` from the full vessels_locations history (server-side)."""
+    vessels_locations.aggregate([
+        {"$sort": {"vesselId": 1, "dateTime": 1}},
+        {"$group": {
+            "_id": "$vesselId",
+            "vesselId": {"$last": "$vesselId"},
+            "lat": {"$last": "$lat"},
+            "lng": {"$last": "$lng"},
+            "firstSeen": {"$first": "$dateTime"},
+            "lastSeen": {"$last": "$dateTime"},
+            "reportCount": {"$sum": 1},
+            "recent": {"$lastN": {
+                "n": VESSEL_LATEST_WINDOW,
+                "input": {"lat": "$lat", "lng": "$lng", "dateTime": "$dateTime"},
+            }},
+        }},
+        {"$merge": {"into": vessel_latest.name, "on": "_id", "whenMatched": "replace"}},
+    ], allowDiskUse=True)
+    count = vessel_latest.count_documents({})
+    print(f"[VesselLatest] rebuilt for {count} vessel(s)")
+    return count
@@ -0,0 +1,50 @@
+"""
+Run the background jobs in their own process, without the API.
+
+Usage:
+    python -m app.worker
+
+Start the API workers with SCHEDULER_ENABLED=false so the jobs only run
+here. Several worker processes may run side by side; each job still runs
+in one of them at a time (see app/leader.py).
+"""
+import signal
+import threading
+from .database import ensure_indexes
+from .utils import seed_hotspot_counter
+from .timeseries import ensure_vessel_locations_storage
+from .occupancy import ensure_occupancy_counters
+from .migrations import backfill_last_used, convert_hotspot_dates, backfill_geohash
+from .spatial import active_hotspot_index
+from .scheduler import scheduler
+from .leader import job_leases
+from .dwell import stop_following
+
+
+def main():
+    ensure_vessel_locations_storage()
+    ensure_indexes()
+    seed_hotspot_counter()
+    ensure_occupancy_counters()
+    convert_hotspot_dates()
+    backfill_last_used()
+    backfill_geohash()
+    # scan_fishing_activity dedups new hotspots against this index
+    active_hotspot_index.rebuild()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    scheduler.start()
+    print("[Scheduler] started (worker process)")
+    stop.wait()
+
+    scheduler.shutdown()
+    stop_following()
+    job_leases.release_all()
+    print("[Scheduler] stopped")
+
+
+if __name__ == "__main__":
+    main()
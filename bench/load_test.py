@@ -0,0 +1,100 @@
+"""
+HTTP load test for the fishing hotspots API.
+
+Fires a fixed number of requests from concurrent clients at one or more
+deployments and prints throughput and latency percentiles side by side, so
+a build can be compared against the previous one, e.g.:
+
+    python bench/load_test.py --url http://old:9002 --url http://new:9002 \
+        --path "/suggest_fishing_hotspots?latitude=7.1&longitude=79.8" \
+        --requests 2000 --concurrency 64
+"""
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(base_url, path, method="GET", body=None, total=1000, concurrency=32, timeout=30):
+    """Send `total` requests with `concurrency` clients; return a summary dict."""
+    url = base_url.rstrip("/") + path
+    sessions = [requests.Session() for _ in range(concurrency)]
+    latencies, errors = [], 0
+
+    def worker(slot):
+        nonlocal errors
+        session = sessions[slot]
+        for _ in range(slot, total, concurrency):
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, json=body, timeout=timeout)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "url": url,
+        "method": method,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", action="append", required=True, help="Base URL (repeat to compare deployments)")
+    parser.add_argument("--path", default="/suggest_fishing_hotspots?latitude=7.1&longitude=79.8")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--body", help="JSON request body")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    body = json.loads(args.body) if args.body else None
+    results = [
+        run_load(url, args.path, args.method, body, args.requests, args.concurrency)
+        for url in args.url
+    ]
+
+    print(f"{'url':50} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for r in results:
+        lat = r["latency_ms"]
+        print(f"{r['url'][:50]:50} {r['throughput_rps']:>9} {lat['p50']:>9} "
+              f"{lat['p95']:>9} {lat['p99']:>9} {r['errors']:>7}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
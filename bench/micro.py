@@ -0,0 +1,123 @@
+"""
+Micro-benchmarks of the hot helpers and of every scheduler job.
+
+The pure functions need no data; the scheduler jobs run against
+MONGODB_URL / MONGODB_DB, so seed it first (see bench/seed.py):
+
+    MONGODB_DB=aquasafe_bench python -m bench.micro --repeat 20 --output micro.json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from bench.load_test import percentile
+
+
+def time_call(func, repeat=5, number=1):
+    """Run `func` `number` times per sample, `repeat` samples; per-call timings in µs."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number)
+    samples.sort()
+    return {
+        "calls": repeat * number,
+        "mean_us": round(statistics.fmean(samples) * 1e6, 3),
+        "min_us": round(samples[0] * 1e6, 3),
+        "p50_us": round(percentile(samples, 50) * 1e6, 3),
+        "p95_us": round(percentile(samples, 95) * 1e6, 3),
+        "p99_us": round(percentile(samples, 99) * 1e6, 3),
+    }
+
+
+def pure_benchmarks(size=1000, seed=42):
+    """(name, callable, number) of the functions that do not touch MongoDB."""
+    import numpy as np
+    from app.utils import haversine, haversine_np, parse_location_data, parse_location_batch
+    from app.apis.suggestions import calculate_distance_km
+    from app.lora import parse_text_frame
+    from app.dwell import DwellDetector
+    from app.models import VesselLocationRequest
+    from bench.seed import coast_point
+
+    rng = random.Random(seed)
+    points = [coast_point(rng.uniform(0, 6.283), rng.uniform(0.03, 0.35)) for _ in range(size)]
+    lats = np.array([p[0] for p in points])
+    lngs = np.array([p[1] for p in points])
+    request = VesselLocationRequest(id="123|0001", l="7.12345|79.81234")
+    ids = [f"{i}|{i % 10000:04d}" for i in range(size)]
+    locations = [f"{lat}|{lng}" for lat, lng in points]
+    frame = "\n".join(f"{i},{l},0" for i, l in zip(ids, locations)).encode()
+    # One new position per vessel per minute, like live traffic
+    detector = DwellDetector(500, 3600, 900, 128)
+    minute = iter(range(10 ** 9))
+
+    def feed_dwell():
+        t = next(minute) * 60.0
+        detector.feed([(vessel, t, lat, lng) for vessel, (lat, lng) in enumerate(points)])
+
+    return [
+        ("haversine", lambda: haversine(7.1, 79.8, 7.2, 79.9), 10000),
+        ("calculate_distance_km", lambda: calculate_distance_km(7.1, 79.8, 7.2, 79.9), 10000),
+        (f"haversine_np[{size}]", lambda: haversine_np(lats, lngs, 7.1, 79.8), 100),
+        ("parse_location_data", lambda: parse_location_data(request), 10000),
+        (f"parse_location_batch[{size}]", lambda: parse_location_batch(ids, locations), 10),
+        (f"lora.parse_text_frame[{size}]", lambda: parse_text_frame(frame), 10),
+        (f"dwell.feed[{size}]", feed_dwell, 10),
+    ]
+
+
+def job_benchmarks():
+    """(name, callable, number) of the scheduler jobs, run against the seeded database."""
+    from app import scheduler
+    from app.spatial import active_hotspot_index
+
+    def unleased(job):
+        # leader_only would time a lease upsert, or skip the run when another worker holds the lease
+        return getattr(job, "__wrapped__", job)
+
+    active_hotspot_index.rebuild()
+    return [
+        ("job.check_vessel_activity", unleased(scheduler.check_vessel_activity), 1),
+        ("job.scan_fishing_activity", unleased(scheduler.scan_fishing_activity), 1),
+        ("job.deactivate_unused_hotspots", unleased(scheduler.deactivate_unused_hotspots), 1),
+        ("job.rollup_vessel_locations", unleased(scheduler.rollup_vessel_locations), 1),
+    ]
+
+
+def run_micro(repeat=5, size=1000, jobs=True):
+    """Time every benchmark; returns {name: timings}."""
+    benchmarks = pure_benchmarks(size)
+    if jobs:
+        benchmarks += job_benchmarks()
+    results = {}
+    for name, func, number in benchmarks:
+        try:
+            results[name] = time_call(func, repeat, number)
+        except Exception as e:
+            results[name] = {"error": str(e)}
+            print(f"{name:40} failed: {e}")
+            continue
+        print(f"{name:40} p50 {results[name]['p50_us']:>14} µs  p99 {results[name]['p99_us']:>14} µs")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per benchmark")
+    parser.add_argument("--size", type=int, default=1000, help="Items per call of the batch benchmarks")
+    parser.add_argument("--no-jobs", action="store_true", help="Skip the scheduler jobs (no database needed)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run_micro(args.repeat, args.size, jobs=not args.no_jobs)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Full benchmark run: seed a throwaway database, micro-benchmark the helpers
+and scheduler jobs, drive the HTTP endpoints, and write everything to one
+JSON file that later runs can be compared against.
+
+Start the API on the same database first, then e.g.:
+
+    MONGODB_DB=aquasafe_bench uvicorn app.main:app --port 9002 &
+    MONGODB_DB=aquasafe_bench python -m bench.run --url http://localhost:9002 \
+        --hotspots 5000 --vessels 500 --points 200000 --output bench-1.2.json
+    MONGODB_DB=aquasafe_bench python -m bench.run ... --compare bench-1.1.json
+
+With --compare, any timing more than --tolerance percent slower than the
+baseline (or throughput that dropped by as much) is reported and the exit
+status is 1.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from bench.load_test import run_load
+from bench.micro import run_micro
+from bench.seed import add_seed_arguments, check_target, coast_point, seed_database
+
+LAT, LNG = coast_point(3.3, 0.1)
+
+# (name, method, path, body)
+HTTP_SCENARIOS = [
+    ("suggest", "GET", f"/suggest_fishing_hotspots?latitude={LAT}&longitude={LNG}", None),
+    ("fishing_locations_month", "GET", "/get_fishing_locations?period=month", None),
+    ("vessels_latest", "GET", "/vessels/latest", None),
+    ("vessel_locations_page", "GET", "/get_all_vessel_locations?limit=1000", None),
+    ("save_vessel_location", "POST", "/save_vessel_location", {"id": "V99999|0001", "l": f"{LAT}|{LNG}"}),
+]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of `results` against `baseline`, as printable strings."""
+    regressions = []
+    limit = 1 + tolerance / 100
+    for name, timing in results.get("micro", {}).items():
+        before = baseline.get("micro", {}).get(name)
+        if "p50_us" not in timing or not before or not before.get("p50_us"):
+            continue
+        if timing["p50_us"] > before["p50_us"] * limit:
+            regressions.append(f"{name}: p50 {before['p50_us']} → {timing['p50_us']} µs")
+    for name, run in results.get("http", {}).items():
+        before = baseline.get("http", {}).get(name)
+        if not before:
+            continue
+        if before["latency_ms"]["p99"] and run["latency_ms"]["p99"] > before["latency_ms"]["p99"] * limit:
+            regressions.append(f"{name}: p99 {before['latency_ms']['p99']} → {run['latency_ms']['p99']} ms")
+        if run["throughput_rps"] * limit < before["throughput_rps"]:
+            regressions.append(f"{name}: {before['throughput_rps']} → {run['throughput_rps']} req/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser)
+    parser.add_argument("--no-seed", action="store_true", help="Reuse the data already in MONGODB_DB")
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per micro-benchmark")
+    parser.add_argument("--url", help="Base URL of the API under test (HTTP scenarios are skipped without it)")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", help="Baseline JSON file of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=20.0, help="Allowed slowdown in percent")
+    args = parser.parse_args(argv)
+
+    results = {
+        "startedAt": datetime.utcnow().isoformat(),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+    }
+    if not args.no_seed:
+        check_target(args.force)
+        results["seed"] = seed_database(args.hotspots, args.vessels, args.points, args.links, args.seed)
+
+    results["micro"] = run_micro(args.repeat)
+
+    if args.url:
+        results["http"] = {}
+        for name, method, path, body in HTTP_SCENARIOS:
+            results["http"][name] = run_load(args.url, path, method, body, args.requests, args.concurrency)
+            run = results["http"][name]
+            print(f"{name:40} {run['throughput_rps']:>9} req/s  p50 {run['latency_ms']['p50']} ms  "
+                  f"p99 {run['latency_ms']['p99']} ms  errors {run['errors']}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[Bench] results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"[Bench] regression – {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
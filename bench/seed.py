@@ -0,0 +1,168 @@
+"""
+Seed a benchmark database with synthetic hotspots, vessels and vessel tracks
+around the Sri Lankan coastline.
+
+The target is MONGODB_URL / MONGODB_DB; its collections are dropped first,
+so point MONGODB_DB at a throwaway database (e.g. a local mongod):
+
+    MONGODB_DB=aquasafe_bench python -m bench.seed --hotspots 5000 --vessels 500 --points 200000
+"""
+import argparse
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+# Rough ellipse hugging the coastline; tracks stay 3-40 km offshore
+COAST_CENTER = (7.87, 80.77)
+COAST_RADII = (2.05, 1.25)
+OFFSHORE_DEG = (0.03, 0.35)
+POINT_INTERVAL_SECONDS = 60
+INSERT_BATCH = 10000
+
+
+def coast_point(angle, offshore):
+    """(lat, lng) `offshore` degrees outside the coastline ellipse at `angle`."""
+    return (
+        round(COAST_CENTER[0] + (COAST_RADII[0] + offshore) * math.sin(angle), 5),
+        round(COAST_CENTER[1] + (COAST_RADII[1] + offshore) * math.cos(angle), 5),
+    )
+
+
+def synthetic_track(rng, vessel_id, points, end):
+    """A vessel drifting along the coast, one position every POINT_INTERVAL_SECONDS up to `end`."""
+    angle = rng.uniform(0, 2 * math.pi)
+    offshore = rng.uniform(*OFFSHORE_DEG)
+    heading = rng.choice((-1, 1))
+    for step in range(points):
+        ts = end - timedelta(seconds=POINT_INTERVAL_SECONDS * (points - 1 - step))
+        # Mostly cruising, sometimes lingering over a fishing ground
+        if rng.random() < 0.7:
+            angle += heading * rng.uniform(0.0002, 0.0015)
+        offshore = min(max(offshore + rng.gauss(0, 0.002), OFFSHORE_DEG[0]), OFFSHORE_DEG[1])
+        lat, lng = coast_point(angle, offshore)
+        yield {"vesselId": vessel_id, "dateTime": ts.isoformat(), "ts": ts, "lat": lat, "lng": lng}
+
+
+def seed_database(hotspots=1000, vessels=100, points=50000, links=0.3, seed=42):
+    """
+    Drop and refill the app collections. Returns a summary with the counts
+    and the seconds spent per step.
+    """
+    from app.database import (db, fishing_locations, hotspots_vessels, vessels_locations,
+                              vessel_latest, counters, ensure_indexes)
+    from app.timeseries import ensure_vessel_locations_storage
+    from app.utils import geo_point, seed_hotspot_counter
+    from app.spatial import geohash_encode, HOTSPOT_GEOHASH_PRECISION
+    from app.vessel_latest import update_vessel_latest
+    from app.occupancy import recount_occupancy
+
+    rng = random.Random(seed)
+    timings = {}
+    now = datetime.now()
+
+    started = time.perf_counter()
+    for collection in (fishing_locations, hotspots_vessels, vessels_locations, vessel_latest, counters):
+        collection.drop()
+    ensure_vessel_locations_storage()
+    ensure_indexes()
+    timings["reset"] = time.perf_counter() - started
+
+    # Hotspots: 80 % active, created over the last 60 days
+    started = time.perf_counter()
+    documents = []
+    for hotspot_id in range(1, hotspots + 1):
+        lat, lng = coast_point(rng.uniform(0, 2 * math.pi), rng.uniform(*OFFSHORE_DEG))
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 60))
+        documents.append({
+            "hotspotId": hotspot_id,
+            "vesselId": f"V{rng.randrange(max(vessels, 1)):05d}",
+            "messageId": f"{rng.randrange(10000):04d}",
+            "latitude": lat,
+            "longitude": lng,
+            "location": geo_point(lat, lng),
+            "geohash": geohash_encode(lat, lng, HOTSPOT_GEOHASH_PRECISION),
+            "currentDateTime": created,
+            "status": "active" if rng.random() < 0.8 else "inactive",
+            "f": 1,
+            "vesselCount": 0,
+            "lastUsedDateTime": created,
+        })
+    for start in range(0, len(documents), INSERT_BATCH):
+        fishing_locations.insert_many(documents[start:start + INSERT_BATCH])
+    seed_hotspot_counter()
+    active_ids = [d["hotspotId"] for d in documents if d["status"] == "active"]
+    timings["hotspots"] = time.perf_counter() - started
+
+    # Tracks: `points` positions shared evenly between the vessels
+    started = time.perf_counter()
+    per_vessel = points // vessels if vessels else 0
+    batch = []
+    for vessel in range(vessels):
+        for document in synthetic_track(rng, f"V{vessel:05d}", per_vessel, now):
+            batch.append(document)
+            if len(batch) >= INSERT_BATCH:
+                vessels_locations.insert_many(batch)
+                update_vessel_latest(batch)
+                batch = []
+    if batch:
+        vessels_locations.insert_many(batch)
+        update_vessel_latest(batch)
+    timings["tracks"] = time.perf_counter() - started
+
+    # Active links for a share of the vessels
+    started = time.perf_counter()
+    linked = []
+    if active_ids:
+        for vessel in rng.sample(range(vessels), int(vessels * links)):
+            linked.append({
+                "vesselId": f"V{vessel:05d}",
+                "hotspotId": rng.choice(active_ids),
+                "dateTime": (now - timedelta(minutes=rng.randint(0, 600))).isoformat(),
+                "status": 1,
+            })
+    if linked:
+        hotspots_vessels.insert_many(linked)
+    recount_occupancy()
+    timings["links"] = time.perf_counter() - started
+
+    summary = {
+        "database": db.name,
+        "hotspots": hotspots,
+        "activeHotspots": len(active_ids),
+        "vessels": vessels,
+        "points": per_vessel * vessels,
+        "links": len(linked),
+        "seconds": {step: round(seconds, 3) for step, seconds in timings.items()},
+    }
+    print(f"[Bench] seeded {summary}")
+    return summary
+
+
+def check_target(force=False):
+    """Refuse to wipe the production database name unless forced."""
+    from app.database import db
+
+    if db.name == "aquasafe" and not force:
+        raise SystemExit("Set MONGODB_DB to a throwaway database (or pass --force): seeding drops its collections.")
+
+
+def add_seed_arguments(parser):
+    parser.add_argument("--hotspots", type=int, default=1000)
+    parser.add_argument("--vessels", type=int, default=100)
+    parser.add_argument("--points", type=int, default=50000, help="Track points in total")
+    parser.add_argument("--links", type=float, default=0.3, help="Share of vessels with an active hotspot link")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="Allow seeding the 'aquasafe' database")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser)
+    args = parser.parse_args(argv)
+    check_target(args.force)
+    seed_database(args.hotspots, args.vessels, args.points, args.links, args.seed)
+
+
+if __name__ == "__main__":
+    main()
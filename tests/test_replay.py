@@ -0,0 +1,29 @@
+import os
+from unittest import mock
+
+import pytest
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+
+from app import replay  # noqa: E402
+from app.database import APP_COLLECTIONS  # noqa: E402
+
+
+@pytest.mark.parametrize("name", sorted(APP_COLLECTIONS) + ["system.users"])
+def test_drop_refuses_live_collections(name):
+    fake_db = mock.MagicMock()
+    with mock.patch.object(replay, "db", fake_db), pytest.raises(SystemExit, match="Refusing"):
+        replay.main(["--target", name, "--drop"])
+    fake_db.__getitem__.assert_not_called()
+    fake_db.__getitem__.return_value.drop.assert_not_called()
+
+
+def test_drop_empties_a_scratch_target():
+    fake_db = mock.MagicMock()
+    # Stop right after the target is prepared, before any worker is started
+    with mock.patch.object(replay, "db", fake_db), \
+            mock.patch.object(replay, "ProcessPoolExecutor", side_effect=RuntimeError("stop")), \
+            pytest.raises(RuntimeError, match="stop"):
+        replay.main(["--target", "replay_hotspots", "--drop"])
+    fake_db.__getitem__.assert_called_once_with("replay_hotspots")
+    fake_db.__getitem__.return_value.drop.assert_called_once()